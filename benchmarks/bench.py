@@ -0,0 +1,140 @@
+"""
+Times the parser, the ENML converter and the note writer separately on a
+synthetic export and records throughput and peak RSS as JSON.
+
+    python benchmarks/bench.py --notes 10000 --attachment-size 1M --output bench.json
+
+Each stage runs in its own process so its peak RSS isn't hidden by another
+stage's.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from enex_parser import EnexParser
+from enml_converter import ENMLConverter
+from memory_stats import parse_size, peak_rss_bytes
+from note import NoteWriter
+from note_listener import NoteListener
+from synthetic_enex import write_synthetic_enex
+
+STAGES = ["parse", "convert", "write"]
+
+class CountingNoteListener(NoteListener):
+    """
+    Drops notes as soon as they are parsed so only the parser is measured.
+    """
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def add_note(self, note):
+        self.count += 1
+
+def collect_notes(enex_path):
+    note_listener = NoteListener()
+    parser = EnexParser()
+    parser.register_note_listener(note_listener)
+    parser.parseNoteXML(enex_path)
+    return note_listener.notes
+
+def bench_parse(enex_path, _work_dir):
+    note_listener = CountingNoteListener()
+    parser = EnexParser()
+    parser.register_note_listener(note_listener)
+    start = time.perf_counter()
+    parser.parseNoteXML(enex_path)
+    return time.perf_counter() - start, note_listener.count, os.path.getsize(enex_path)
+
+def bench_convert(enex_path, _work_dir):
+    contents = [note.content for note in collect_notes(enex_path) if note.content is not None]
+    enml_converter = ENMLConverter()
+    start = time.perf_counter()
+    for content in contents:
+        enml_converter.to_markdown(content)
+    return time.perf_counter() - start, len(contents), sum(len(c.encode("utf-8")) for c in contents)
+
+def bench_write(enex_path, work_dir):
+    notes = collect_notes(enex_path)
+    output_dir = Path(work_dir, "output")
+    note_writer = NoteWriter(output_dir)
+    start = time.perf_counter()
+    for note in notes:
+        note_writer.add_note(note)
+    note_writer.close()
+    seconds = time.perf_counter() - start
+    bytes_written = sum(p.stat().st_size for p in output_dir.rglob("*") if p.is_file())
+    return seconds, len(notes), bytes_written
+
+def run_stage(stage, enex_path, work_dir):
+    bench_function = {"parse": bench_parse, "convert": bench_convert, "write": bench_write}[stage]
+    seconds, notes, num_bytes = bench_function(enex_path, work_dir)
+    return {
+        "stage": stage,
+        "seconds": seconds,
+        "notes": notes,
+        "bytes": num_bytes,
+        "notes_per_s": notes / seconds if seconds > 0 else None,
+        "mb_per_s": num_bytes / (1024 * 1024) / seconds if seconds > 0 else None,
+        "peak_rss": peak_rss_bytes(),
+    }
+
+def run_stage_in_subprocess(stage, enex_path, work_dir):
+    output = subprocess.run(
+        [sys.executable, __file__, "--run-stage", stage, "--input", str(enex_path), "--work-dir", str(work_dir)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+def get_cli_args():
+    argparser = argparse.ArgumentParser(description="Benchmarks enex2markdown on a synthetic export.")
+    argparser.add_argument("--notes", type=int, default=1000)
+    argparser.add_argument("--content-size", type=parse_size, default="4K")
+    argparser.add_argument("--nesting-depth", type=int, default=3)
+    argparser.add_argument("--attachment-size", type=parse_size, default="0")
+    argparser.add_argument("--attachments-per-note", type=int, default=1)
+    argparser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    argparser.add_argument("--input", help="Benchmark an existing export instead of generating one")
+    argparser.add_argument("--work-dir", help="Directory for the generated export and output (default: a temporary directory)")
+    argparser.add_argument("--output", help="Write the results to this JSON file as well as stdout")
+    argparser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    return argparser.parse_args()
+
+def main():
+    args = get_cli_args()
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, args.input, args.work_dir)))
+        return
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        enex_path = args.input
+        if enex_path is None:
+            enex_path = Path(work_dir, "synthetic.enex")
+            write_synthetic_enex(enex_path, notes=args.notes, content_size=args.content_size,
+                                 nesting_depth=args.nesting_depth, attachment_size=args.attachment_size,
+                                 attachments_per_note=args.attachments_per_note)
+        results = {
+            "parameters": {
+                "input": str(args.input) if args.input else None,
+                "notes": args.notes,
+                "content_size": args.content_size,
+                "nesting_depth": args.nesting_depth,
+                "attachment_size": args.attachment_size,
+                "attachments_per_note": args.attachments_per_note,
+                "input_bytes": os.path.getsize(enex_path),
+            },
+            "python": sys.version.split()[0],
+            "stages": [run_stage_in_subprocess(stage, enex_path, work_dir) for stage in args.stages],
+        }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
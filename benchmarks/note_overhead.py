@@ -0,0 +1,82 @@
+"""
+Measures the per-note overhead of the note writing path on many small
+in-memory notes. Output goes to a backend that drops everything, so the time
+is spent converting, naming and formatting rather than on the filesystem.
+
+    python benchmarks/note_overhead.py --notes 100000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from note import Note, NoteResource, NoteWriter
+
+class NullOutput:
+    failed_files = set()
+
+    def write_text(self, filename, text):
+        pass
+
+    def write_resource(self, filename, resource):
+        pass
+
+    def link(self, shared_file, filename):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def make_notes(count):
+    start = datetime(2010, 1, 1, tzinfo=timezone.utc)
+    notes = []
+    for i in range(count):
+        note = Note()
+        note.title = f"Note {i}"
+        note.content = f"<en-note><div>Body of note {i}</div><div>Second <b>line</b></div></en-note>"
+        note.created = start + timedelta(minutes=i)
+        note.updated = note.created + timedelta(hours=1)
+        note.tags = ["benchmark", f"tag{i % 10}"]
+        resource = NoteResource()
+        resource.filename = f"Scan {i} (page 1).pdf"
+        resource.mime = "application/pdf"
+        resource.data = "aGVsbG8="
+        note.resources.append(resource)
+        notes.append(note)
+    return notes
+
+def bench(note_count, repeat):
+    best = None
+    for _ in range(repeat):
+        notes = make_notes(note_count)
+        note_writer = NoteWriter(Path("unused"))
+        note_writer.output = NullOutput()
+        start = time.perf_counter()
+        for note in notes:
+            note_writer.add_note(note)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measures the per-note overhead of writing small notes.")
+    argparser.add_argument("--notes", type=int, default=100000)
+    argparser.add_argument("--repeat", type=int, default=3, help="Report the fastest of this many runs")
+    args = argparser.parse_args()
+    seconds = bench(args.notes, args.repeat)
+    print(json.dumps({
+        "notes": args.notes,
+        "seconds": seconds,
+        "us_per_note": seconds / args.notes * 1e6,
+        "python": sys.version.split()[0],
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Generates synthetic ENEX exports for benchmarking.
+
+    python benchmarks/synthetic_enex.py OUTPUT_FILENAME --notes 1000 --content-size 4K --attachment-size 1M
+"""
+import argparse
+import base64
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from memory_stats import parse_size
+
+BASE64_LINE_LENGTH = 76
+# Bytes per base64 block written, a multiple of 3 and of a line's worth of bytes
+ATTACHMENT_BLOCK_SIZE = 57 * 1024 * 16
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit",
+         "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore"]
+
+def write_synthetic_enex(path, notes=1000, content_size=4096, nesting_depth=3,
+                         attachment_size=0, attachments_per_note=1, tags_per_note=2, seed=0):
+    rng = random.Random(seed)
+    # Random payloads are slow to generate so one block is reused
+    attachment_block = rng.randbytes(ATTACHMENT_BLOCK_SIZE) if attachment_size > 0 else b""
+    start_time = datetime(2010, 1, 1, tzinfo=timezone.utc)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export3.dtd">\n')
+        f.write('<en-export export-date="20240101T000000Z" application="Evernote" version="10">\n')
+        for i in range(notes):
+            created = start_time + timedelta(minutes=17 * i)
+            f.write("<note>")
+            f.write(f"<title>{escape(make_sentence(rng, 6))} {i}</title>\n")
+            f.write("<content><![CDATA[")
+            f.write(make_content(rng, content_size, nesting_depth))
+            f.write("]]></content>\n")
+            f.write(f"<created>{created:%Y%m%dT%H%M%SZ}</created>")
+            f.write(f"<updated>{created + timedelta(hours=1):%Y%m%dT%H%M%SZ}</updated>\n")
+            for t in range(tags_per_note):
+                f.write(f"<tag>{rng.choice(WORDS)}-{t}</tag>")
+            f.write("<note-attributes><author>benchmark</author></note-attributes>\n")
+            if attachment_size > 0:
+                for a in range(attachments_per_note):
+                    f.write('<resource><data encoding="base64">\n')
+                    write_base64(f, attachment_block, attachment_size)
+                    f.write("</data><mime>application/octet-stream</mime>")
+                    f.write(f"<resource-attributes><file-name>attachment-{a}.bin</file-name></resource-attributes>")
+                    f.write("</resource>\n")
+            f.write("</note>\n")
+        f.write("</en-export>\n")
+
+def make_sentence(rng, word_count):
+    return " ".join(rng.choice(WORDS) for _ in range(word_count))
+
+def make_content(rng, content_size, nesting_depth):
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n',
+        '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">\n',
+        '<en-note>',
+    ]
+    size = 0
+    while size < content_size:
+        paragraph = make_paragraph(rng, nesting_depth)
+        parts.append(paragraph)
+        size += len(paragraph)
+    parts.append("</en-note>")
+    return "".join(parts)
+
+def make_paragraph(rng, nesting_depth):
+    kind = rng.random()
+    if kind < 0.1:
+        inner = f'<a href="https://example.com/{rng.randrange(10000)}">{make_sentence(rng, 3)}</a>'
+    elif kind < 0.2:
+        inner = f"{make_sentence(rng, 8)}<br/>{make_sentence(rng, 8)}"
+    else:
+        inner = make_sentence(rng, 20)
+    depth = rng.randint(1, max(1, nesting_depth))
+    return "<div>" * depth + inner + "</div>" * depth + "\n"
+
+def write_base64(f, block, size):
+    remaining = size
+    while remaining > 0:
+        chunk = block[:min(remaining, len(block))]
+        encoded = base64.b64encode(chunk).decode("ascii")
+        for start in range(0, len(encoded), BASE64_LINE_LENGTH):
+            f.write(encoded[start:start + BASE64_LINE_LENGTH])
+            f.write("\n")
+        remaining -= len(chunk)
+
+def main():
+    argparser = argparse.ArgumentParser(description="Generates a synthetic ENEX file for benchmarks.")
+    argparser.add_argument("output_filename")
+    argparser.add_argument("--notes", type=int, default=1000)
+    argparser.add_argument("--content-size", type=parse_size, default="4K", help="Approximate ENML size per note")
+    argparser.add_argument("--nesting-depth", type=int, default=3, help="Maximum <div> nesting per paragraph")
+    argparser.add_argument("--attachment-size", type=parse_size, default="0", help="Size of each attachment, e.g. 1M or 5G")
+    argparser.add_argument("--attachments-per-note", type=int, default=1)
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+    write_synthetic_enex(args.output_filename, notes=args.notes, content_size=args.content_size,
+                         nesting_depth=args.nesting_depth, attachment_size=args.attachment_size,
+                         attachments_per_note=args.attachments_per_note, seed=args.seed)
+
+if __name__ == "__main__":
+    main()
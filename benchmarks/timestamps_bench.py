@@ -0,0 +1,77 @@
+"""
+Times parsing and formatting a million ENEX timestamps against the
+straightforward implementations (slicing and int() for every field,
+strftime for every use).
+
+    python benchmarks/timestamps_bench.py --timestamps 1000000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from timestamps import parse_timestamp, format_timestamp
+
+def make_corpus(count, distinct_ratio, seed):
+    """
+    created/updated pairs from ten years of notes. Unedited notes have the
+    same created and updated time, and imported notes share timestamps.
+    """
+    rng = random.Random(seed)
+    start = datetime(2010, 1, 1, tzinfo=timezone.utc).timestamp()
+    pool_size = max(1, int(count * distinct_ratio))
+    pool = [datetime.fromtimestamp(start + rng.randrange(10 * 365 * 86400), timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+            for _ in range(pool_size)]
+    corpus = []
+    while len(corpus) < count:
+        created = rng.choice(pool)
+        corpus.append(created)
+        corpus.append(created if rng.random() < 0.4 else rng.choice(pool))
+    return corpus[:count]
+
+def parse_sliced(datestr):
+    return datetime(int(datestr[0:4]), int(datestr[4:6]), int(datestr[6:8]),
+                    int(datestr[9:11]), int(datestr[11:13]), int(datestr[13:15]), tzinfo=timezone.utc)
+
+def format_strftime(value):
+    # The five uses of a created timestamp per note with one resource
+    return (str(value.year), value.strftime('%Y%m%dT%H%M%SZ'), value.strftime('%Y%m%dT%H%M%SZ'),
+            value.strftime('%Y%m%dT%H%M%SZ'), value.strftime('%Y-%m-%d %H:%M:%S'))
+
+def format_cached(value):
+    formatted = format_timestamp(value)
+    return (formatted.year, formatted.compact, formatted.compact, formatted.compact, formatted.display)
+
+def time_function(function, values):
+    start = time.perf_counter()
+    results = [function(value) for value in values]
+    return time.perf_counter() - start, results
+
+def main():
+    argparser = argparse.ArgumentParser(description="Times ENEX timestamp parsing and formatting.")
+    argparser.add_argument("--timestamps", type=int, default=1000000)
+    argparser.add_argument("--distinct-ratio", type=float, default=0.5, help="Distinct timestamps / timestamps")
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+    corpus = make_corpus(args.timestamps, args.distinct_ratio, args.seed)
+    parse_before, parsed = time_function(parse_sliced, corpus)
+    parse_after, parsed_after = time_function(parse_timestamp, corpus)
+    assert parsed == parsed_after
+    format_before, formatted = time_function(format_strftime, parsed)
+    format_after, formatted_after = time_function(format_cached, parsed)
+    assert formatted == formatted_after
+    print(json.dumps({
+        "timestamps": args.timestamps,
+        "distinct": len(set(corpus)),
+        "parse_seconds": {"sliced": parse_before, "cached": parse_after},
+        "format_seconds": {"strftime": format_before, "cached": format_after},
+        "python": sys.version.split()[0],
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
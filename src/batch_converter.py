@@ -0,0 +1,128 @@
+import logging
+import glob
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from memory_stats import format_bytes
+from input_reader import get_export_name
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+ENEX_SUFFIXES = (".enex", ".enex.gz", ".enex.zst")
+GLOB_CHARACTERS = "*?["
+
+def expand_inputs(input_names):
+    """
+    Returns the export files named by input_names, which can be files,
+    directories holding .enex (or .enex.gz, .enex.zst) files or glob patterns. Each file is only
+    returned once, in the order it was first named.
+    """
+    xml_paths = {}
+    for input_name in input_names:
+        if any(c in input_name for c in GLOB_CHARACTERS):
+            matches = [Path(name) for name in sorted(glob.glob(input_name, recursive=True))]
+        elif Path(input_name).is_dir():
+            matches = sorted(p for p in Path(input_name).iterdir() if p.name.lower().endswith(ENEX_SUFFIXES))
+        else:
+            matches = [Path(input_name)]
+        for xml_path in matches:
+            xml_paths.setdefault(xml_path.resolve(), xml_path)
+    return list(xml_paths.values())
+
+def is_batch(input_names):
+    # Converting a single named file keeps writing straight into the output dir
+    return len(input_names) > 1 or any(c in input_names[0] for c in GLOB_CHARACTERS) \
+        or Path(input_names[0]).is_dir()
+
+def get_notebook_dirs(output_dir, xml_paths):
+    """
+    One output subdirectory per notebook, named after the export file.
+    Exports with the same name in different directories get a numbered
+    suffix.
+    """
+    used_names = set()
+    notebook_dirs = []
+    for xml_path in xml_paths:
+        name = get_export_name(xml_path)
+        suffix = 2
+        while name.lower() in used_names:
+            name = f"{get_export_name(xml_path)}-{suffix}"
+            suffix += 1
+        used_names.add(name.lower())
+        notebook_dirs.append(Path(output_dir, name))
+    return notebook_dirs
+
+class BatchConverter:
+    """
+    Converts several exports at once with one worker process per export and
+    at most jobs exports in progress. convert_function is called in the
+    worker with one of the tasks and returns the number of notes converted.
+    A failed export is reported in the summary and doesn't stop the others.
+    """
+    def __init__(self, convert_function, jobs, progress=False, progress_stream=sys.stderr):
+        self.convert_function = convert_function
+        self.jobs = jobs
+        self.progress = progress
+        self.progress_stream = progress_stream
+        self.results = []
+        self.seconds = None
+
+    def run(self, tasks):
+        """
+        tasks is a list of (xml_path, task) pairs.
+        """
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(self.jobs) as executor:
+            futures = {executor.submit(convert_in_worker, self.convert_function, xml_path, task): xml_path
+                       for xml_path, task in tasks}
+            for future in as_completed(futures):
+                result = future.result()
+                self.results.append(result)
+                if self.progress:
+                    print(f"{len(self.results)}/{len(tasks)} notebooks: {format_result(result)}",
+                          file=self.progress_stream, flush=True)
+        order = {str(xml_path): i for i, (xml_path, _task) in enumerate(tasks)}
+        self.results.sort(key=lambda result: order[result["file"]])
+        self.seconds = time.perf_counter() - start_time
+        return self.results
+
+    def failures(self):
+        return [result for result in self.results if result["error"] is not None]
+
+    def report(self):
+        return {
+            "notebooks": len(self.results),
+            "failed": len(self.failures()),
+            "notes": sum(result["notes"] for result in self.results),
+            "bytes": sum(result["bytes"] for result in self.results),
+            "seconds": self.seconds,
+            "files": self.results,
+        }
+
+    def format_report(self):
+        report = self.report()
+        lines = [f"Converted {report['notebooks']} notebooks ({report['failed']} failed): "
+                 f"{report['notes']} notes, {format_bytes(report['bytes'])} in {report['seconds']:.1f} s"]
+        name_width = max((len(result["file"]) for result in self.results), default=0)
+        for result in self.results:
+            lines.append(f"  {result['file']:<{name_width}}  {format_result(result)}")
+        return "\n".join(lines)
+
+def convert_in_worker(convert_function, xml_path, task):
+    result = {"file": str(xml_path), "notes": 0, "bytes": 0, "seconds": 0.0, "error": None}
+    start_time = time.perf_counter()
+    try:
+        result["bytes"] = xml_path.stat().st_size
+        result["notes"] = convert_function(task)
+    except Exception as e:
+        logger.error(f"Failed to convert {xml_path}: {e}")
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start_time
+    return result
+
+def format_result(result):
+    if result["error"] is not None:
+        return f"FAILED {result['error']}"
+    return f"{result['notes']} notes, {format_bytes(result['bytes'])} in {result['seconds']:.1f} s"
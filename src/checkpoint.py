@@ -0,0 +1,107 @@
+import logging
+import json
+import os
+from pathlib import Path
+
+from note_listener import NoteListener
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+CHECKPOINT_FILENAME = ".enex2markdown-checkpoint.json"
+CHECKPOINT_VERSION = 1
+DEFAULT_CHECKPOINT_INTERVAL = 1000
+
+class Checkpoint:
+    """
+    How far a conversion into output_dir got: the number of notes from the
+    start of the export that are completely written, and the writer state
+    needed to carry on after them. It is saved every few notes and removed
+    once the conversion finishes, so it's only left behind by runs that
+    didn't finish.
+    """
+    def __init__(self, output_dir, xml_path):
+        self.path = Path(output_dir, CHECKPOINT_FILENAME)
+        stat = os.stat(xml_path)
+        self.input_size = stat.st_size
+        self.input_mtime_ns = stat.st_mtime_ns
+        self.notes_done = 0
+        self.last_title = None
+        self.writer_state = None
+
+    def load(self):
+        """
+        Returns True if there is a checkpoint for the same export.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return False
+        if saved.get("version") != CHECKPOINT_VERSION or saved.get("input_size") != self.input_size \
+                or saved.get("input_mtime_ns") != self.input_mtime_ns:
+            logger.warning(f"Ignoring checkpoint {self.path} because it was made for a different export")
+            return False
+        self.notes_done = saved["notes_done"]
+        self.last_title = saved["last_title"]
+        self.writer_state = saved["writer_state"]
+        return True
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "input_size": self.input_size,
+                "input_mtime_ns": self.input_mtime_ns,
+                "notes_done": self.notes_done,
+                "last_title": self.last_title,
+                "writer_state": self.writer_state,
+            }, f)
+        os.replace(tmp_path, self.path)
+        logger.debug(f"Checkpoint after {self.notes_done} notes")
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+class CheckpointListener(NoteListener):
+    """
+    Counts the notes passed on to note_listener and saves a checkpoint every
+    interval notes, once everything before it has been written.
+    """
+    def __init__(self, note_listener, checkpoint, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.note_listener = note_listener
+        self.checkpoint = checkpoint
+        self.interval = interval
+
+    def skip_note(self, note):
+        if self.note_listener.skip_note(note):
+            self.note_done(note)
+            return True
+        return False
+
+    def add_note(self, note):
+        self.note_listener.add_note(note)
+        self.note_done(note)
+
+    def note_filtered_out(self, note):
+        self.note_listener.note_filtered_out(note)
+        self.note_done(note)
+
+    def note_done(self, note):
+        self.checkpoint.notes_done += 1
+        self.checkpoint.last_title = note.title
+        if self.checkpoint.notes_done % self.interval == 0:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        self.note_listener.flush()
+        self.checkpoint.writer_state = self.note_listener.get_state()
+        self.checkpoint.save()
+
+    def close(self):
+        self.note_listener.close()
+        self.checkpoint.remove()
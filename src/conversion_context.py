@@ -0,0 +1,11 @@
+from enml_converter import ENMLConverter
+
+class ConversionContext:
+    """
+    What the note writing path keeps from one note to the next instead of
+    building it again for every note: the ENML parser. Each writer, and so
+    each worker process, has its own. Timestamps are cached for the whole
+    process by the timestamps module instead.
+    """
+    def __init__(self):
+        self.enml_converter = ENMLConverter()
@@ -0,0 +1,161 @@
+import logging
+import heapq
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+from memory_stats import peak_rss_bytes, format_bytes
+from timestamps import format_timestamp
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+STAGES = ["parse", "handlers", "decode", "convert", "io"]
+
+class NullStats:
+    """
+    Stand-in used when statistics aren't wanted, so instrumented code
+    doesn't have to check.
+    """
+    enabled = False
+
+    def timer(self, stage):
+        return nullcontext()
+
+    def note_finished(self, note, seconds):
+        pass
+
+class ConversionStats:
+    """
+    Collects where the time goes during a conversion. Stage times are
+    exclusive: time spent in a nested stage isn't also counted in the stage
+    around it. In --jobs mode conversion and writes happen in the worker
+    processes, so they show up as time in the handlers instead.
+    """
+    enabled = True
+
+    def __init__(self, total_bytes=None, slowest_count=10, progress=False, progress_stream=sys.stderr,
+                 progress_interval=1.0):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.notes = 0
+        # Index in the export of the first note parsed, so the slowest notes
+        # get the 0-based index --note takes even when part of it is converted
+        self.first_note = 0
+        self.slowest_count = slowest_count
+        self.slowest_notes = [] # Min heap of (seconds, ordinal, title, created)
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.timer_stack = []
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.progress = progress
+        self.progress_stream = progress_stream
+        self.progress_interval = progress_interval
+        self.last_progress_time = self.start_time
+
+    def start(self, stage):
+        now = time.perf_counter()
+        if len(self.timer_stack) > 0:
+            self.stage_seconds[self.timer_stack[-1][0]] += now - self.timer_stack[-1][1]
+        self.timer_stack.append([stage, now])
+
+    def stop(self):
+        now = time.perf_counter()
+        stage, start = self.timer_stack.pop()
+        self.stage_seconds[stage] += now - start
+        if len(self.timer_stack) > 0:
+            self.timer_stack[-1][1] = now
+
+    @contextmanager
+    def timer(self, stage):
+        self.start(stage)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def note_finished(self, note, seconds):
+        created = format_timestamp(note.created).compact if note.created is not None else None
+        entry = (seconds, self.first_note + self.notes, note.title, created)
+        self.notes += 1
+        if len(self.slowest_notes) < self.slowest_count:
+            heapq.heappush(self.slowest_notes, entry)
+        elif self.slowest_count > 0:
+            heapq.heappushpop(self.slowest_notes, entry)
+        if self.progress:
+            now = time.perf_counter()
+            if now - self.last_progress_time >= self.progress_interval:
+                self.last_progress_time = now
+                self.print_progress(now)
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+        if self.progress:
+            self.print_progress(self.end_time)
+            self.progress_stream.write("\n")
+
+    def elapsed(self, now=None):
+        end_time = now or self.end_time or time.perf_counter()
+        return end_time - self.start_time
+
+    def print_progress(self, now):
+        elapsed = self.elapsed(now)
+        line = f"{self.notes} notes, {self.notes / elapsed:.1f} notes/s, {format_bytes(self.bytes_read)}"
+        if self.total_bytes:
+            fraction = min(self.bytes_read / self.total_bytes, 1.0)
+            line += f" of {format_bytes(self.total_bytes)} ({fraction:.1%})"
+            if fraction > 0:
+                line += f", ETA {format_duration(elapsed / fraction - elapsed)}"
+        self.progress_stream.write(f"\r{line}  ")
+        self.progress_stream.flush()
+
+    def report(self):
+        elapsed = self.elapsed()
+        return {
+            "notes": self.notes,
+            "elapsed_seconds": elapsed,
+            "bytes_read": self.bytes_read,
+            "total_bytes": self.total_bytes,
+            "notes_per_s": self.notes / elapsed if elapsed > 0 else None,
+            "mb_per_s": self.bytes_read / (1024 * 1024) / elapsed if elapsed > 0 else None,
+            "peak_rss": peak_rss_bytes(),
+            "stage_seconds": dict(self.stage_seconds),
+            "slowest_notes": [
+                {"seconds": seconds, "ordinal": ordinal, "title": title, "created": created}
+                for seconds, ordinal, title, created in sorted(self.slowest_notes, reverse=True)
+            ],
+        }
+
+    def format_report(self):
+        report = self.report()
+        elapsed = report["elapsed_seconds"]
+        lines = [
+            f"Converted {report['notes']} notes in {format_duration(elapsed)} "
+            f"({report['notes_per_s'] or 0:.1f} notes/s, {report['mb_per_s'] or 0:.1f} MB/s, "
+            f"peak RSS {format_bytes(report['peak_rss'])})",
+            "Time by stage:",
+        ]
+        for stage, seconds in report["stage_seconds"].items():
+            share = seconds / elapsed if elapsed > 0 else 0
+            lines.append(f"  {stage:<10} {seconds:10.2f}s {share:7.1%}")
+        if len(report["slowest_notes"]) > 0:
+            lines.append("Slowest notes:")
+            for note in report["slowest_notes"]:
+                lines.append(f"  {note['seconds']:8.3f}s  #{note['ordinal']}  {note['created']}  {note['title']}")
+        return "\n".join(lines)
+
+class CountingReader:
+    """
+    File-like wrapper that counts the bytes the parser has read.
+    """
+    def __init__(self, f, stats):
+        self.f = f
+        self.stats = stats
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.stats.bytes_read += len(data)
+        return data
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
@@ -1,9 +1,25 @@
 
 import logging
 import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
 
 from enex_parser import EnexParser
 from note import NoteWriter
+from parallel_writer import ParallelNoteWriter
+from note_index import NoteIndex
+from conversion_stats import ConversionStats
+from sqlite_writer import SQLiteNoteWriter, get_note_count
+from checkpoint import Checkpoint, CheckpointListener, DEFAULT_CHECKPOINT_INTERVAL
+from input_reader import open_enex, is_compressed, DEFAULT_READ_BLOCK_SIZE
+from memory_stats import parse_size
+from resource_data import DEFAULT_SPOOL_THRESHOLD
+from note_filter import NoteFilter, parse_filter_date
+from batch_converter import BatchConverter, expand_inputs, is_batch, get_notebook_dirs
 
 logger = logging.getLogger("enex2markdown")
 logger.addHandler(logging.StreamHandler())
@@ -14,10 +30,176 @@ def get_cli_args():
         prog='enex2markdown.py',
         description='Converts an EXEX export file from Evernote to a directory of markdown files and attachments.',
         )
-    argparser.add_argument('input_filename')
+    argparser.add_argument('input_filenames', nargs='+', metavar='input_filename', help='Export files, directories of .enex files or glob patterns. With more than one export each notebook is written to its own subdirectory of OUTPUT_DIR')
     argparser.add_argument('-o', '--output-dir', default='.')
+    argparser.add_argument('-a', '--archive', metavar='FILENAME', help='Write everything into a .zip, .tar, .tar.gz or .tar.zst archive instead of OUTPUT_DIR')
+    argparser.add_argument('--sqlite', metavar='FILENAME', help='Load the notes into a SQLite database with a full text index instead of writing files')
+    argparser.add_argument('--append', action='store_true', help='Add the notes to a --sqlite database that already has notes')
+    argparser.add_argument('-j', '--jobs', type=int, default=1, help='Number of processes converting and writing notes, or converting notebooks when there is more than one')
+    argparser.add_argument('-i', '--incremental', action='store_true', help='Skip notes that are unchanged since the last export to OUTPUT_DIR')
+    argparser.add_argument('--io-threads', type=int, default=0, metavar='N', help='Write output files from N background threads')
+    attachments_group = argparser.add_mutually_exclusive_group()
+    attachments_group.add_argument('--no-attachments', action='store_true', help='Leave attachments out entirely')
+    attachments_group.add_argument('--attachments-metadata-only', action='store_true', help='List the name, type, size and MD5 of each attachment instead of writing it')
+    argparser.add_argument('--dedup-attachments', choices=['shared', 'hardlink'],
+        help='Write identical attachments once and link to (shared) or hardlink (hardlink) the first copy')
+    argparser.add_argument('--resume', action='store_true', help='Carry on from the checkpoint left in OUTPUT_DIR by a conversion that didn\'t finish')
+    argparser.add_argument('--checkpoint-interval', type=int, default=DEFAULT_CHECKPOINT_INTERVAL, metavar='N', help='Save a checkpoint to OUTPUT_DIR every N notes, 0 to never save one')
+    argparser.add_argument('--tag', action='append', metavar='TAG', help='Only convert notes with this tag. Can be given more than once to convert notes with any of the tags')
+    argparser.add_argument('--since', type=parse_date_arg, metavar='DATE', help='Only convert notes created (or updated, see --date-field) at or after DATE, e.g. 2019-01-01')
+    argparser.add_argument('--until', type=parse_date_arg, metavar='DATE', help='Only convert notes created (or updated) before DATE')
+    argparser.add_argument('--date-field', choices=['created', 'updated'], default='created', help='Which time --since and --until apply to')
+    argparser.add_argument('--title-match', type=parse_regex_arg, metavar='REGEX', help='Only convert notes whose title matches REGEX')
+    argparser.add_argument('--shard', type=parse_shard, help='Only convert shard INDEX/COUNT of the notes (INDEX is 0-based)')
+    note_group = argparser.add_mutually_exclusive_group()
+    note_group.add_argument('--note', type=int, help='Only convert the note with this 0-based index')
+    note_group.add_argument('--note-title', metavar='TITLE', help='Only convert the first note titled TITLE')
+    argparser.add_argument('--index', action='store_true', help='Write index.jsonl describing every note and its attachments, and Tags.md and Years.md pages listing the notes, to OUTPUT_DIR')
+    argparser.add_argument('--progress', action='store_true', help='Show progress, notes/s and ETA while converting')
+    argparser.add_argument('--stats', action='store_true', help='Print where the time went at the end')
+    argparser.add_argument('--stats-json', metavar='FILENAME', help='Write the statistics to FILENAME as JSON')
+    argparser.add_argument('--slowest', type=int, default=10, metavar='N', help='Number of slowest notes listed in the statistics')
+    argparser.add_argument('--spool-threshold', type=parse_size_arg, default=DEFAULT_SPOOL_THRESHOLD, metavar='SIZE', help='Decode attachments bigger than SIZE to a file instead of memory, e.g. 16M')
+    argparser.add_argument('--read-block-size', type=parse_size_arg, default=DEFAULT_READ_BLOCK_SIZE, metavar='SIZE', help='Read the export in blocks of SIZE, e.g. 4M')
     argparser.add_argument('-l', '--log-level', default="warning", choices=["debug", "info", "warning", "error", "critical"])
-    return argparser.parse_args()
+    args = argparser.parse_args()
+    args.batch = is_batch(args.input_filenames)
+    args.input_filenames = expand_inputs(args.input_filenames)
+    if len(args.input_filenames) == 0:
+        argparser.error("no .enex files found")
+    args.input_filename = args.input_filenames[0]
+    # --note-title is turned into a --note index once the options are checked
+    note_option = "--note-title" if args.note_title is not None else "--note"
+    one_note = args.note is not None or args.note_title is not None
+    if args.batch:
+        for option, value in [("--archive", args.archive), ("--sqlite", args.sqlite), ("--shard", args.shard),
+                              (note_option, one_note)]:
+            if value:
+                argparser.error(f"{option} can't be used with more than one export")
+    if args.sqlite is not None and args.archive is not None:
+        argparser.error("--sqlite and --archive can't be used together")
+    if args.sqlite is not None:
+        for option, value in [("--jobs", args.jobs > 1), ("--io-threads", args.io_threads > 0),
+                              ("--incremental", args.incremental), ("--dedup-attachments", args.dedup_attachments)]:
+            if value:
+                argparser.error(f"{option} can't be used with --sqlite")
+        try:
+            note_count = get_note_count(args.sqlite)
+        except sqlite3.DatabaseError as e:
+            argparser.error(f"{args.sqlite} can't be read as a SQLite database: {e}")
+        if not args.append and note_count > 0:
+            argparser.error(f"{args.sqlite} already has notes, use --append to add these to them")
+    elif args.append:
+        argparser.error("--append can only be used with --sqlite")
+    if args.index:
+        # Shards may run at the same time and would each write the index
+        for option, value in [("--archive", args.archive), ("--sqlite", args.sqlite), ("--shard", args.shard),
+                              (note_option, one_note)]:
+            if value:
+                argparser.error(f"--index can't be used with {option}")
+    if not args.batch and is_compressed(args.input_filename):
+        for option, value in [("--shard", args.shard), (note_option, one_note), ("--resume", args.resume)]:
+            if value:
+                argparser.error(f"{option} needs an uncompressed export")
+    if args.resume:
+        for option, value in [("--archive", args.archive), ("--sqlite", args.sqlite), ("--shard", args.shard),
+                              (note_option, one_note), ("--checkpoint-interval 0", args.checkpoint_interval <= 0)]:
+            if value:
+                argparser.error(f"--resume can't be used with {option}")
+    if args.archive is not None:
+        for option, value in [("--jobs", args.jobs > 1), ("--io-threads", args.io_threads > 0),
+                              ("--incremental", args.incremental)]:
+            if value:
+                argparser.error(f"{option} can't be used with --archive")
+        if args.dedup_attachments == "hardlink" and args.archive.lower().endswith(".zip"):
+            argparser.error("zip archives can't hold hardlinks, use --dedup-attachments shared")
+    if args.note_title is not None:
+        args.note = NoteIndex.load_or_build(args.input_filename).find_title(args.note_title)
+        if args.note is None:
+            argparser.error(f"no note titled {args.note_title!r} in {args.input_filename}")
+    return args
+
+def parse_shard(shard_str):
+    try:
+        shard_index, shard_count = (int(s) for s in shard_str.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected INDEX/COUNT, got {shard_str}")
+    if not 0 <= shard_index < shard_count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {shard_count - 1}")
+    return (shard_index, shard_count)
+
+def parse_size_arg(size_str):
+    try:
+        size = parse_size(size_str)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size like 4M, got {size_str}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError("the size must be positive")
+    return size
+
+def parse_date_arg(date_str):
+    try:
+        return parse_filter_date(date_str)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date like 2019-01-01, got {date_str}")
+
+def parse_regex_arg(regex_str):
+    try:
+        re.compile(regex_str)
+    except re.error as e:
+        raise argparse.ArgumentTypeError(f"invalid regular expression: {e}")
+    return regex_str
+
+def get_note_filter(args):
+    if args.tag is None and args.since is None and args.until is None and args.title_match is None:
+        return None
+    return NoteFilter(tags=args.tag, since=args.since, until=args.until, date_field=args.date_field,
+                      title_pattern=args.title_match)
+
+@contextmanager
+def open_input(args, checkpoint=None):
+    """
+    Yields what to pass to EnexParser.parseNoteXML and the (title, created)
+    headers of the notes before it. Converting part of the export uses the
+    note index so the rest of the file isn't read.
+    """
+    if checkpoint is not None and checkpoint.notes_done > 0:
+        index = NoteIndex.load_or_build(args.input_filename)
+        logger.info(f"Resuming after note {checkpoint.notes_done}: {checkpoint.last_title}")
+        with index.open_notes(checkpoint.notes_done, len(index)) as f:
+            yield f, index.headers(0, checkpoint.notes_done)
+        return
+    if args.shard is None and args.note is None:
+        with open_enex(args.input_filename, args.read_block_size) as f:
+            yield f, []
+        return
+    index = NoteIndex.load_or_build(args.input_filename)
+    if args.note is not None:
+        start, stop = args.note, args.note + 1
+    else:
+        start, stop = index.shard(*args.shard)
+    with index.open_notes(start, stop) as f:
+        yield f, index.headers(0, start)
+
+def uses_checkpoints(args):
+    # Only a whole uncompressed export written to a directory can be resumed
+    return args.checkpoint_interval > 0 and args.archive is None and args.sqlite is None \
+        and args.shard is None and args.note is None and not is_compressed(args.input_filename)
+
+def get_input_size(args, xml_input):
+    if hasattr(xml_input, "size"):
+        return xml_input.size
+    if is_compressed(args.input_filename):
+        return None # Progress can't be shown against the compressed size
+    return os.path.getsize(args.input_filename)
+
+def report_stats(args, stats):
+    stats.finish()
+    if args.stats:
+        print(stats.format_report())
+    if args.stats_json:
+        with open(args.stats_json, "w", encoding="utf-8") as f:
+            json.dump(stats.report(), f, indent=2)
 
 def set_logging_level(level_str):
     level_dict = {
@@ -32,9 +214,82 @@ def set_logging_level(level_str):
 def main():
     args = get_cli_args()
     set_logging_level(args.log_level)
-    parser = EnexParser()
-    parser.register_note_listener(NoteWriter(args.output_dir))
-    parser.parseNoteXML(args.input_filename)
+    if args.batch:
+        convert_batch(args)
+    else:
+        convert(args)
+
+def convert_batch(args):
+    tasks = []
+    for xml_path, notebook_dir in zip(args.input_filenames, get_notebook_dirs(args.output_dir, args.input_filenames)):
+        # Each notebook is converted by one process, --jobs is how many run at once
+        notebook_args = argparse.Namespace(**vars(args))
+        notebook_args.input_filename = xml_path
+        notebook_args.output_dir = notebook_dir
+        notebook_args.jobs = 1
+        notebook_args.progress = notebook_args.stats = False
+        notebook_args.stats_json = None
+        tasks.append((xml_path, notebook_args))
+    batch_converter = BatchConverter(convert, args.jobs, progress=args.progress)
+    batch_converter.run(tasks)
+    print(batch_converter.format_report())
+    if args.stats_json:
+        with open(args.stats_json, "w", encoding="utf-8") as f:
+            json.dump(batch_converter.report(), f, indent=2)
+    if len(batch_converter.failures()) > 0:
+        sys.exit(1)
+
+def convert(args):
+    """
+    Converts args.input_filename and returns the number of notes in it.
+    """
+    attachments = EnexParser.Attachments.ALL
+    if args.no_attachments:
+        attachments = EnexParser.Attachments.NONE
+    elif args.attachments_metadata_only:
+        attachments = EnexParser.Attachments.METADATA
+    parser = EnexParser(attachments, args.spool_threshold)
+    parser.set_note_filter(get_note_filter(args))
+    resource_dedup = None
+    if args.dedup_attachments is not None:
+        resource_dedup = NoteWriter.ResourceDedup[args.dedup_attachments.upper()]
+    if args.sqlite is not None:
+        note_writer = SQLiteNoteWriter(args.sqlite, append=args.append)
+    elif args.archive is not None:
+        note_writer = NoteWriter(args.archive, NoteWriter.OutputStyle.ARCHIVE, resource_dedup=resource_dedup)
+    else:
+        # Shards may run at the same time, so only whole conversions save the names
+        note_writer = NoteWriter(args.output_dir, incremental=args.incremental, resource_dedup=resource_dedup,
+                                 io_threads=args.io_threads, persistent_names=args.shard is None and args.note is None,
+                                 index=args.index, attachments=attachments)
+        parser.set_spool_dir(note_writer.spool_dir)
+    note_listener = note_writer
+    if args.jobs > 1:
+        note_listener = ParallelNoteWriter(note_writer, args.jobs)
+    checkpoint = None
+    if uses_checkpoints(args):
+        checkpoint = Checkpoint(args.output_dir, args.input_filename)
+        if args.resume and checkpoint.load():
+            note_listener.set_state(checkpoint.writer_state)
+        note_listener = CheckpointListener(note_listener, checkpoint, args.checkpoint_interval)
+    parser.register_note_listener(note_listener)
+    stats = None
+    if args.progress or args.stats or args.stats_json:
+        stats = ConversionStats(slowest_count=args.slowest, progress=args.progress)
+        parser.set_stats(stats)
+        note_writer.stats = stats
+    with open_input(args, checkpoint) as (xml_input, earlier_notes):
+        if isinstance(note_writer, NoteWriter):
+            # Same-second suffixes count the notes before the ones converted
+            note_writer.name_earlier_notes(earlier_notes)
+        if stats is not None:
+            stats.total_bytes = get_input_size(args, xml_input)
+            stats.first_note = len(earlier_notes)
+        parser.parseNoteXML(xml_input)
+    note_listener.close()
+    if stats is not None:
+        report_stats(args, stats)
+    return parser.note_store.note_count
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,16 +1,51 @@
 import logging
+import time
+from contextlib import contextmanager
+from enum import Enum
 from lxml import etree
-from datetime import datetime, timezone
 from note import Note, NoteResource
+from memory_stats import peak_rss_bytes, reset_peak_rss, format_bytes
+from resource_data import ResourceData, ResourceDigest, Base64StreamDecoder, DEFAULT_SPOOL_THRESHOLD
+from conversion_stats import NullStats, CountingReader
+from timestamps import parse_timestamp
 
 logger = logging.getLogger("enex2markdown." + __name__)
 
+# Bytes handed to lxml at a time. Text arrives at the handlers in pieces
+# of about this size, which bounds the memory a <data> element takes.
+FEED_SIZE = 256 * 1024
+
 # Thanks to http://www.hanxiaogang.com/writing/parsing-evernote-export-file-enex-using-python/
 # for inspiration
 class EnexParser:
-    def __init__(self):
+    class Attachments(Enum):
+        ALL = 1
+        METADATA = 2 # Only the mime type, filename, size and hash are kept
+        NONE = 3 # Notes have no resources
+
+    def __init__(self, attachments = Attachments.ALL, spool_threshold = DEFAULT_SPOOL_THRESHOLD):
+        self.attachments = attachments
         self.note_store = NoteStore()
+        self.note_store.spool_threshold = spool_threshold
         self.init_taghandlers()
+        self.peak_rss = None
+        self.peak_rss_per_run = False # Otherwise it's the peak of the process
+        self.stats = NullStats()
+
+    def set_stats(self, stats):
+        self.stats = stats
+        self.note_store.stats = stats
+
+    def set_note_filter(self, note_filter):
+        self.note_store.note_filter = note_filter
+
+    def set_spool_dir(self, spool_dir):
+        """
+        Attachments bigger than the spool threshold are decoded to files in
+        spool_dir. A directory on the same filesystem as the output lets the
+        writer rename them into place.
+        """
+        self.note_store.spool_dir = spool_dir
 
     def init_taghandlers(self):
         self.tag_handlers = {
@@ -25,31 +60,183 @@ class EnexParser:
             "mime": MimeHandler(self.note_store),
             "file-name": FileNameHandler(self.note_store),
         }
+        if self.attachments == EnexParser.Attachments.METADATA:
+            self.tag_handlers["data"] = DataDigestHandler(self.note_store)
+        elif self.attachments == EnexParser.Attachments.NONE:
+            # lxml still has to read past the payloads, but their text
+            # goes nowhere
+            for tag in ["resource", "mime", "file-name"]:
+                del self.tag_handlers[tag]
+            self.tag_handlers["data"] = DiscardHandler(self.note_store)
 
     def parseNoteXML(self, xmlFile: str) -> None:
-        context = etree.iterparse(xmlFile, events=["start", "end"], encoding='utf-8', strip_cdata=False, huge_tree=True)
-        for ind, (action, elem) in enumerate(context):
-            self.handleParserEvent(ind, action, elem)
+        self.peak_rss_per_run = reset_peak_rss()
+        self.note_store.log_notes = logger.isEnabledFor(logging.INFO)
+        if self.stats.enabled:
+            target = EnexStatsTarget(self.tag_handlers, self.stats)
+        elif logger.isEnabledFor(logging.DEBUG):
+            target = EnexDebugTarget(self.tag_handlers)
+        else:
+            target = EnexTarget(self.tag_handlers)
+        # lxml hands the target each element's text in the pieces it was fed
+        # in, so no element's text, not even a huge <data>, is ever held whole
+        # unless a handler collects it
+        xml_parser = etree.XMLParser(target=target, encoding='utf-8', huge_tree=True)
+        with open_xml_input(xmlFile) as f:
+            if self.stats.enabled:
+                self.feed_with_stats(xml_parser, CountingReader(f, self.stats))
+            else:
+                for block in iter(lambda: f.read(FEED_SIZE), b""):
+                    xml_parser.feed(block)
+        xml_parser.close()
+        self.peak_rss = peak_rss_bytes()
+        peak_of = "this parse" if self.peak_rss_per_run else "the process"
+        logger.info(f"Peak RSS of {peak_of}: {format_bytes(self.peak_rss)}")
 
-    def handleParserEvent(self, ind: int, action: str, elem) -> None:
-        logger.debug(f"Found elem with tag: {elem.tag}. ind: {ind}, action: {action}")
-        if elem.tag in self.tag_handlers:
-            self.tag_handlers[elem.tag].handle_event(action, elem)
+    def feed_with_stats(self, xml_parser, f):
+        # Handlers are timed by EnexStatsTarget, the rest of feed() is lxml
+        stats = self.stats
+        while True:
+            block = f.read(FEED_SIZE)
+            if not block:
+                break
+            stats.start("parse")
+            try:
+                xml_parser.feed(block)
+            finally:
+                stats.stop()
 
     def register_note_listener(self, listener):
         self.note_store.note_listener = listener
 
+class EnexTarget:
+    """
+    Passes lxml's parse events to the tag handlers. Text is collected for
+    elements whose handler wants all of it, handlers that stream it get it
+    piece by piece through data(), and other text is dropped.
+
+    Unlike iterparse(tag=...), a target parser calls into Python for every
+    element, including the ones without a handler, so those return as early
+    as possible. That costs some speed on exports with many note and
+    resource attributes, but keeps a <data> element's text from ever being
+    held whole.
+    """
+    def __init__(self, tag_handlers):
+        self.tag_handlers = tag_handlers
+        self.text = None # Text pieces of the current element, if collected
+        self.on_data = None
+
+    def start(self, tag, attrib):
+        handler = self.tag_handlers.get(tag)
+        if handler is None:
+            return
+        handler.start()
+        if handler.collects_text:
+            self.text = []
+            self.on_data = self.text.append
+        elif handler.streams_text:
+            self.on_data = handler.data
+
+    def data(self, text):
+        if self.on_data is not None:
+            self.on_data(text)
+
+    def end(self, tag):
+        handler = self.tag_handlers.get(tag)
+        if handler is None:
+            return
+        text = self.text
+        # Only elements without children have text a handler wants, so text
+        # after this element belongs to a parent that doesn't
+        self.text = self.on_data = None
+        handler.end("".join(text) if text else None)
+
+    def close(self):
+        pass
+
+class EnexDebugTarget(EnexTarget):
+    def start(self, tag, attrib):
+        logger.debug(f"Found elem with tag: {tag}. action: start")
+        super().start(tag, attrib)
+
+    def end(self, tag):
+        logger.debug(f"Found elem with tag: {tag}. action: end")
+        super().end(tag)
+
+class EnexStatsTarget(EnexTarget):
+    def __init__(self, tag_handlers, stats):
+        super().__init__(tag_handlers)
+        self.stats = stats
+
+    def start(self, tag, attrib):
+        self.stats.start("handlers")
+        try:
+            super().start(tag, attrib)
+        finally:
+            self.stats.stop()
+
+    def end(self, tag):
+        self.stats.start("handlers")
+        try:
+            super().end(tag)
+        finally:
+            self.stats.stop()
+
 class NoteStore:
     def __init__(self):
         self.note = None
         self.note_listener = None
+        self.header_complete = False
+        self.skip = False
+        self.stats = NullStats()
+        self.note_start_time = None
+        self.log_notes = False # Checked once per parse instead of per log call
+        self.note_count = 0
+        self.note_filter = None
+        self.content_text = None
+        self.spool_threshold = DEFAULT_SPOOL_THRESHOLD
+        self.spool_dir = None
 
     def new_note(self):
         self.note = Note()
+        self.header_complete = False
+        self.skip = False
+        self.content_text = None
+        if self.stats.enabled:
+            self.note_start_time = time.perf_counter()
+
+    def end_header(self):
+        """
+        Called once everything but the resources has been parsed, which is
+        the earliest point a listener can decide to skip the note.
+        """
+        if self.header_complete:
+            return
+        self.header_complete = True
+        if self.note_filter is not None:
+            if not self.note_filter.matches(self.note):
+                if self.log_notes:
+                    logger.info(f"Filtered out note: {self.note.title}")
+                self.skip = True
+                if self.note_listener:
+                    self.note_listener.note_filtered_out(self.note)
+                return
+            # The content is only read once the note is known to be wanted
+            if self.content_text is not None:
+                self.note.content = self.content_text
+                self.content_text = None
+        if self.note_listener and self.note_listener.skip_note(self.note):
+            if self.log_notes:
+                logger.info(f"Skipping note: {self.note.title}")
+            self.skip = True
 
     def end_note(self):
-        if self.note_listener:
+        self.note_count += 1
+        self.end_header()
+        if self.note_listener and not self.skip:
             self.note_listener.add_note(self.note)
+        if self.stats.enabled:
+            self.stats.note_finished(self.note, time.perf_counter() - self.note_start_time)
         self.note = None
 
     def new_resource(self):
@@ -60,84 +247,141 @@ class NoteStore:
         self.resource = None
 
 class BaseHandler:
+    """
+    Handles one tag. Handlers that collect text get the element's whole
+    text in end(), handlers that stream it get it in pieces through data().
+    """
+    collects_text = True
+    streams_text = False
+
     def __init__(self, note_store):
         self.note_store = note_store
 
-    def handle_event(self, action, elem):
+    def start(self):
+        pass
+
+    def data(self, text):
+        pass
+
+    def end(self, text):
         pass
 
 class NoteHandler(BaseHandler):
-    def handle_event(self, action, _elem):
-        if action == "start":
-            logger.debug(f"Found a note")
-            self.note_store.new_note()
-        elif action == "end":
-            self.note_store.end_note()
+    collects_text = False
+
+    def start(self):
+        self.note_store.new_note()
+
+    def end(self, _text):
+        self.note_store.end_note()
 
 class CreatedHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            datestr = elem.text
-            logger.info(f"Created: {datestr}")
-            self.note_store.note.created = parseDateTime(datestr)
+    def end(self, text):
+        if self.note_store.log_notes:
+            logger.info(f"Created: {text}")
+        self.note_store.note.created = parse_timestamp(text)
 
 class UpdatedHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            datestr = elem.text
-            self.note_store.note.updated = parseDateTime(datestr)
+    def end(self, text):
+        self.note_store.note.updated = parse_timestamp(text)
 
 class TitleHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            logger.info(f"Title: {elem.text}")
-            self.note_store.note.title = elem.text
+    def end(self, text):
+        if self.note_store.log_notes:
+            logger.info(f"Title: {text}")
+        self.note_store.note.title = text
 
 class ContentHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            self.note_store.note.content = elem.text
+    def start(self):
+        # A note the filter already rules out, usually on its title, doesn't
+        # have its content collected
+        note_filter = self.note_store.note_filter
+        self.collects_text = note_filter is None or not note_filter.rules_out(self.note_store.note)
+
+    def end(self, text):
+        if self.note_store.note_filter is not None:
+            # The note may still be filtered out, see NoteStore.end_header
+            self.note_store.content_text = text
+        else:
+            self.note_store.note.content = text
 
 class TagsHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            self.note_store.note.tags.append(elem.text)
+    def end(self, text):
+        self.note_store.note.tags.append(text)
 
 class ResourceHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "start":
-            self.note_store.new_resource()
-        elif action == "end":
-            self.note_store.end_resource()
+    collects_text = False
+
+    def start(self):
+        self.note_store.end_header()
+        self.note_store.new_resource()
+
+    def end(self, _text):
+        self.note_store.end_resource()
 
 class DataHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            self.note_store.resource.data = remove_all_whitespace(get_all_elem_text(elem))
+    """
+    Decodes the base64 text as lxml reads it, so an attachment is never
+    held as text, whatever its size.
+    """
+    collects_text = False
+    streams_text = True
+
+    def start(self):
+        self.decoder = None
+        if not self.note_store.skip:
+            self.output = self.make_output()
+            self.decoder = Base64StreamDecoder(self.output)
+
+    def make_output(self):
+        return ResourceData(self.note_store.spool_threshold, self.note_store.spool_dir)
+
+    def data(self, text):
+        if self.decoder is not None:
+            with self.note_store.stats.timer("decode"):
+                self.decoder.feed(text)
+
+    def end(self, _text):
+        if self.decoder is None:
+            return
+        with self.note_store.stats.timer("decode"):
+            self.decoder.close()
+        self.decoder = None
+        self.resource_done(self.note_store.resource, self.output)
+        self.output = None
+
+    def resource_done(self, resource, resource_data):
+        resource_data.close()
+        resource.decoded_data = resource_data
+        resource.size = resource_data.size
+        resource.hash = resource_data.digest.hexdigest()
+
+class DataDigestHandler(DataHandler):
+    def make_output(self):
+        return ResourceDigest()
+
+    def resource_done(self, resource, resource_digest):
+        resource.size = resource_digest.size
+        resource.hash = resource_digest.digest.hexdigest()
+
+class DiscardHandler(BaseHandler):
+    collects_text = False
 
 class MimeHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            self.note_store.resource.mime = elem.text
+    def end(self, text):
+        self.note_store.resource.mime = text
 
 class FileNameHandler(BaseHandler):
-    def handle_event(self, action, elem):
-        if action == "end":
-            self.note_store.resource.filename = elem.text
-
-def parseDateTime(datestr: str) -> datetime:
-    # Only accepts format:
-    # 20130730T205204Z
-    year = int(datestr[0:4])
-    month = int(datestr[4:6])
-    day = int(datestr[6:8])
-    hour = int(datestr[9:11])
-    minute = int(datestr[11:13])
-    second = int(datestr[13:15])
-    return datetime(year, month, day, hour, minute, second, tzinfo=timezone.utc)
-
-def remove_all_whitespace(s):
-    return ''.join(s.split())
-
-def get_all_elem_text(elem):
-    return ''.join(elem.itertext())
+    def end(self, text):
+        self.note_store.resource.filename = text
+
+# Kept under its old name
+parseDateTime = parse_timestamp
+
+@contextmanager
+def open_xml_input(xmlFile):
+    if hasattr(xmlFile, "read"):
+        yield xmlFile
+    else:
+        with open(xmlFile, "rb") as f:
+            yield f
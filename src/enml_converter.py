@@ -1,49 +1,130 @@
 import logging
+import io
+import re
 
 from lxml import etree
 
 logger = logging.getLogger("enex2markdown." + __name__)
 
+XML_DECLARATION = re.compile(r"\s*<\?xml\s.*?\?>", re.DOTALL)
+FEED_CHUNK_SIZE = 64 * 1024
+
 class ENMLConverter:
+    """
+    Converts ENML to markdown while it is being parsed. The content is fed to
+    an incremental parser in chunks and each element is written out and
+    released as soon as it ends, so a converter never holds a whole note's
+    tree. The parser is reused between notes.
+    """
     def __init__(self):
-        pass
+        self.parser = new_parser()
 
     def to_markdown(self, content: str) -> str:
-        mdlines = []
-        content = remove_xml_pi(content)
-        root = etree.fromstring(content)
-        assert root.tag == "en-note"
-        mdlines += elem_to_markdown(root)
-        mdlines = remove_multiple_blank_lines(mdlines)
-        return "\n".join(mdlines)
-
-def remove_xml_pi(content):
-    content_lines = content.splitlines()
-    content_lines = [c.strip() for c in content_lines if "<?xml " not in c]
-    return "\n".join(content_lines)
-
-def elem_to_markdown(elem):
-    mdlines = []
-    if before_elem(elem, mdlines):
-        if elem.text is not None and len(elem.text.strip()) > 0:
-            mdlines.append(elem.text.strip())
-        for child in elem:
-            mdlines += elem_to_markdown(child)
-    after_elem(elem, mdlines)
-    if elem.tail is not None and len(elem.tail.strip()) > 0:
-        mdlines.append(elem.tail.strip())
-    return mdlines
-
-def before_elem(elem, mdlines):
+        f = io.StringIO()
+        self.write_markdown(content, f)
+        return f.getvalue()
+
+    def write_markdown(self, content: str, f) -> None:
+        mdwriter = MarkdownWriter(f)
+        # The declaration has to be dropped because content usually starts
+        # with whitespace, which isn't allowed before an XML declaration
+        declaration = XML_DECLARATION.match(content)
+        start = declaration.end() if declaration is not None else 0
+        try:
+            for chunk_start in range(start, len(content), FEED_CHUNK_SIZE):
+                self.parser.feed(content[chunk_start:chunk_start + FEED_CHUNK_SIZE])
+                mdwriter.handle_events(self.parser.read_events())
+            self.parser.close()
+            mdwriter.handle_events(self.parser.read_events())
+        except Exception:
+            # The parser can't be reused after a failure
+            self.parser = new_parser()
+            raise
+
+def new_parser():
+    # huge_tree raises libxml2's nesting depth limit from 256 to 2048
+    return etree.XMLPullParser(events=("start", "end", "comment", "pi"), huge_tree=True)
+
+class MarkdownWriter:
+    """
+    Writes the markdown for a stream of ENML parser events to a file object,
+    dropping blank lines after two consecutive ones.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.blank_count = 0
+        self.first_line = True
+        self.skip_depth = 0 # > 0 inside elements whose content isn't converted
+
+    def add_line(self, line):
+        if len(line.strip()) > 0:
+            self.blank_count = 0
+        else:
+            self.blank_count += 1
+            if self.blank_count > 2:
+                return
+        if not self.first_line:
+            self.f.write("\n")
+        self.first_line = False
+        self.f.write(line)
+
+    def handle_events(self, events):
+        # Text is written at the event that follows it, where it is known to
+        # be complete: an element's text at its first child's start or at its
+        # end, and its tail at its next sibling's start or its parent's end.
+        for action, elem in events:
+            if elem.getparent() is None:
+                if action == "start":
+                    assert elem.tag == "en-note"
+                elif action != "end":
+                    continue # Comments and processing instructions outside <en-note>
+            if self.skip_depth > 0:
+                if action == "start":
+                    self.skip_depth += 1
+                elif action == "end":
+                    self.skip_depth -= 1
+                    if self.skip_depth == 0:
+                        end_elem(elem, self)
+                        release_elem(elem)
+                continue
+            if action == "start":
+                write_text(get_preceding_text(elem), self)
+                if not start_elem(elem, self):
+                    self.skip_depth = 1
+            elif action == "end":
+                write_text(elem[-1].tail if len(elem) > 0 else elem.text, self)
+                end_elem(elem, self)
+                release_elem(elem)
+            else:
+                # Comments and processing instructions have no children
+                write_text(get_preceding_text(elem), self)
+                write_text(elem.text, self)
+
+def get_preceding_text(elem):
+    previous = elem.getprevious()
+    if previous is not None:
+        return previous.tail
+    parent = elem.getparent()
+    return parent.text if parent is not None else None
+
+def release_elem(elem):
+    elem.clear(keep_tail=True)
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+def clean_text(text):
+    return "\n".join(line.strip() for line in text.splitlines()).strip()
+
+def write_text(text, mdwriter):
+    if text is not None and len(text.strip()) > 0:
+        mdwriter.add_line(clean_text(text))
+
+def start_elem(elem, mdwriter):
     if elem.tag == "a":
-        url = elem.get('href')
-        if url is not None and len(url.strip()) > 0:
-            text = get_anchor_text(elem)
-            mdlines.append(f"[{text}]({url})")
-        return False
+        return False # Written in end_elem once the anchor text is complete
     if elem.tag == "div":
-        mdlines.append("")
-        mdlines.append("")
+        mdwriter.add_line("")
+        mdwriter.add_line("")
     return True
 
 def get_anchor_text(elem):
@@ -52,25 +133,17 @@ def get_anchor_text(elem):
         url = elem.get('href')
         if url is not None and len(url.strip()) > 0:
             text = url
-    return text.strip()
+    return clean_text(text)
 
-def after_elem(elem, mdlines):
-    if elem.tag == "div":
-        mdlines.append("")
-        mdlines.append("")
+def end_elem(elem, mdwriter):
+    if elem.tag == "a":
+        url = elem.get('href')
+        if url is not None and len(url.strip()) > 0:
+            text = get_anchor_text(elem)
+            mdwriter.add_line(f"[{text}]({url})")
+    elif elem.tag == "div":
+        mdwriter.add_line("")
+        mdwriter.add_line("")
     elif elem.tag == "br":
-        mdlines.append("")
-        mdlines.append("")
-
-def remove_multiple_blank_lines(mdlines):
-    res = []
-    previous_blank_count = 0
-    for line in mdlines:
-        if len(line.strip()) > 0:
-            res.append(line)
-            previous_blank_count = 0
-        else:
-            if previous_blank_count < 2:
-                res.append(line)
-            previous_blank_count += 1
-    return res
\ No newline at end of file
+        mdwriter.add_line("")
+        mdwriter.add_line("")
@@ -0,0 +1,171 @@
+import logging
+import json
+import os
+import urllib.parse
+from pathlib import Path
+
+from incremental_manifest import note_key
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+INDEX_FILENAME = "index.jsonl"
+TAGS_PAGE_FILENAME = "Tags.md"
+YEARS_PAGE_FILENAME = "Years.md"
+
+class ExportIndex:
+    """
+    Describes the converted notes so nothing has to walk the output again.
+    A JSON Lines record with each note's file, title, tags, times and
+    attachments is appended as the note is written, and pages listing the
+    notes by tag and by year are made from the records when the conversion
+    ends. The records are written to a temporary file that replaces the
+    previous index on close.
+
+    Notes an incremental conversion skips weren't written this time, so
+    their records are carried over from the previous index.
+    """
+    def __init__(self, output_dir, incremental=False):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / INDEX_FILENAME
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        # What Path puts in front of a file in output_dir, "" for "."
+        self.path_prefix = str(Path(self.output_dir, "x"))[:-1]
+        self.previous = self.load_previous() if incremental else {}
+        self.pages = [] # (title, path, tags, created) for the index pages
+        self.file = None
+
+    def load_previous(self):
+        previous = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    previous[record["id"]] = record
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable index {self.path}: {e}")
+            return {}
+        return previous
+
+    def add(self, note, filename, resource_filenames):
+        """
+        Records a note written to filename. resource_filenames has a file
+        for each of the note's resources, or None if it has no file.
+        """
+        self.write_record({
+            "id": note_key(note),
+            "path": self.relative_path(filename),
+            "title": note.title,
+            "tags": note.tags,
+            "created": format_iso(note.created),
+            "updated": format_iso(note.updated),
+            "resources": [{
+                "path": self.relative_path(resource_filename) if resource_filename is not None else None,
+                "filename": resource.filename,
+                "mime": resource.mime,
+                "size": resource.size,
+                "md5": resource.hash,
+            } for resource, resource_filename in zip(note.resources, resource_filenames)],
+        })
+
+    def add_unchanged(self, note):
+        record = self.previous.get(note_key(note))
+        if record is None:
+            logger.warning(f"{note.title} was skipped as unchanged but isn't in {self.path}")
+            return
+        self.write_record(record)
+
+    def open(self):
+        if self.file is None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.tmp_path, "wb")
+
+    def write_record(self, record):
+        self.open()
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        self.add_to_pages(record)
+
+    def add_to_pages(self, record):
+        self.pages.append((record["title"], record["path"], record["tags"], record["created"]))
+
+    def relative_path(self, filename):
+        # Every file is under output_dir, and Path.relative_to is slow
+        # enough to show up when called for every note and attachment
+        filename = str(filename)
+        if not filename.startswith(self.path_prefix):
+            raise ValueError(f"{filename} isn't in {self.output_dir}")
+        return filename[len(self.path_prefix):].replace(os.sep, "/")
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def get_size(self):
+        """
+        The size of the records written so far, for resuming after them.
+        """
+        self.flush()
+        return self.file.tell() if self.file is not None else 0
+
+    def resume(self, size):
+        """
+        Keeps the first size bytes of records from an interrupted
+        conversion and continues after them.
+        """
+        if size == 0:
+            return
+        self.file = open(self.tmp_path, "r+b")
+        self.file.truncate(size)
+        for line in self.file:
+            self.add_to_pages(json.loads(line))
+        self.file.seek(0, os.SEEK_END)
+
+    def close(self):
+        self.open() # Even a conversion without notes replaces the old index
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp_path, self.path)
+        self.write_page(TAGS_PAGE_FILENAME, "Tags", self.notes_by_tag())
+        self.write_page(YEARS_PAGE_FILENAME, "Years", self.notes_by_year())
+
+    def notes_by_tag(self):
+        notes_by_tag = {}
+        for entry in self.pages:
+            for tag in entry[2]:
+                notes_by_tag.setdefault(tag, []).append(entry)
+        return sorted(notes_by_tag.items(), key=lambda item: item[0].lower())
+
+    def notes_by_year(self):
+        notes_by_year = {}
+        for entry in self.pages:
+            year = entry[3][:4] if entry[3] is not None else "Unknown"
+            notes_by_year.setdefault(year, []).append(entry)
+        return sorted(notes_by_year.items())
+
+    def write_page(self, filename, heading, sections):
+        tmp_path = Path(self.output_dir, filename + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"# {heading}\n\n")
+            for name, entries in sections:
+                f.write(f"## {name}\n\n")
+                for title, path, _tags, created in sorted(entries, key=page_order):
+                    write_page_link(f, title, path, created)
+                f.write("\n")
+        os.replace(tmp_path, Path(self.output_dir, filename))
+
+def write_page_link(f, title, path, created):
+    text = escape_link_text(title if title else Path(path).stem)
+    date = f" ({created[:10]})" if created is not None else ""
+    f.write(f"- [{text}]({urllib.parse.quote(path)}){date}\n")
+
+def escape_link_text(text):
+    return text.replace("\\", "\\\\").replace("[", "\\[").replace("]", "\\]")
+
+def format_iso(value):
+    return value.isoformat() if value is not None else None
+
+def page_order(entry):
+    _title, path, _tags, created = entry
+    # Shorter first so note-2 comes before note-10
+    return (created or "", len(path), path)
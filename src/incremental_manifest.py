@@ -0,0 +1,144 @@
+import logging
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from timestamps import format_timestamp
+from journal import Journal
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+MANIFEST_FILENAME = ".enex2markdown-manifest.json"
+MANIFEST_VERSION = 2
+JOURNAL_SUFFIX = ".journal"
+
+class IncrementalManifest:
+    """
+    Records which files were written for each note so that a later export
+    into the same directory can skip notes that haven't changed. Notes are
+    identified by their created timestamp and a hash of the title and
+    content, and are up to date if their updated timestamp matches and the
+    files they wrote are still there.
+
+    With deduplicated attachments a note can link to a file another note
+    wrote, so entries also keep the MD5 of each attachment file a note wrote
+    or links to. A note is out of date once a file it links to was last
+    written with a different payload.
+
+    The notes are only up to date for the attachments mode they were written
+    with, so a manifest from a run with another mode is ignored.
+    """
+    def __init__(self, output_dir, attachments="ALL"):
+        self.output_dir = Path(output_dir)
+        self.attachments = attachments
+        self.path = self.output_dir / MANIFEST_FILENAME
+        self.notes = {}
+        self.file_hashes = {} # Attachment file -> MD5 of the payload last written to it
+        self.journal = Journal(self.path.with_name(self.path.name + JOURNAL_SUFFIX))
+        self.journaling = False # Changes go to the journal once a checkpoint was made
+        self.load()
+
+    def load(self):
+        saved = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+        if saved.get("version") != MANIFEST_VERSION:
+            return
+        if saved.get("attachments") != self.attachments:
+            logger.info(f"Writing every note again because {self.path} was written with attachments "
+                        f"{saved.get('attachments')}, not {self.attachments}")
+            return
+        self.notes = saved["notes"]
+        # Notes recorded after the last checkpoint of a conversion that
+        # didn't finish
+        for key, entry in self.journal.read():
+            self.notes[key] = entry
+        for entry in self.notes.values():
+            self.add_file_hashes(entry)
+
+    def save(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "attachments": self.attachments, "notes": self.notes}, f)
+        os.replace(tmp_path, self.path)
+        self.journal.remove()
+
+    def checkpoint(self):
+        """
+        Saves the notes recorded since the last checkpoint. The first
+        checkpoint saves the whole manifest, later ones only append to a
+        journal.
+        """
+        if self.journaling:
+            self.journal.flush()
+        else:
+            self.save()
+            self.journaling = True
+
+    def is_up_to_date(self, note):
+        entry = self.notes.get(note_key(note))
+        if entry is None or entry["updated"] != format_updated(note):
+            return False
+        for filename, resource_hash in entry.get("resources", {}).items():
+            if filename not in entry["files"] and self.file_hashes.get(filename) != resource_hash:
+                return False
+        return all(Path(self.output_dir, filename).exists() for filename in entry["files"])
+
+    def resource_file_written(self, filename, resource_hash):
+        """
+        Notes that filename is being written with a payload, before the
+        notes after it in the export are checked.
+        """
+        self.file_hashes[self.relative_path(filename)] = resource_hash
+
+    def record(self, note, files, resource_files=None):
+        """
+        Records the files written for a note. resource_files has the
+        (file, MD5) of each attachment file the note wrote or links to, when
+        attachments are deduplicated.
+        """
+        key = note_key(note)
+        self.notes[key] = {
+            "updated": format_updated(note),
+            "files": [self.relative_path(filename) for filename in files],
+        }
+        if resource_files:
+            self.notes[key]["resources"] = {self.relative_path(filename): resource_hash
+                                            for filename, resource_hash in resource_files}
+            self.add_file_hashes(self.notes[key])
+        if self.journaling:
+            self.journal.add([key, self.notes[key]])
+
+    def add_file_hashes(self, entry):
+        for filename, resource_hash in entry.get("resources", {}).items():
+            if filename in entry["files"]:
+                self.file_hashes[filename] = resource_hash
+
+    def relative_path(self, filename):
+        return Path(filename).relative_to(self.output_dir).as_posix()
+
+    def forget_files(self, files):
+        if len(files) == 0:
+            return
+        forget = {self.relative_path(filename) for filename in files}
+        self.notes = {key: entry for key, entry in self.notes.items() if forget.isdisjoint(entry["files"])}
+
+def note_key(note):
+    digest = hashlib.sha1()
+    for field in [note.title, note.content]:
+        digest.update((field or "").encode("utf-8"))
+        digest.update(b"\0")
+    created = format_timestamp(note.created).compact if note.created is not None else "-"
+    return f"{created}-{digest.hexdigest()}"
+
+def format_updated(note):
+    if note.updated is None:
+        return None
+    return format_timestamp(note.updated).compact
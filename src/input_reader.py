@@ -0,0 +1,62 @@
+import logging
+import gzip
+import io
+import os
+from contextlib import contextmanager, ExitStack
+
+try:
+    import zstandard
+except ImportError: # Only needed for .enex.zst exports
+    zstandard = None
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+DEFAULT_READ_BLOCK_SIZE = 1024 * 1024
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+
+@contextmanager
+def open_enex(path, block_size=DEFAULT_READ_BLOCK_SIZE):
+    """
+    Yields a file-like object for EnexParser.parseNoteXML. The export is read
+    from disk in block_size reads, and the kernel is told it will be read
+    sequentially so it reads further ahead. .enex.gz and .enex.zst exports
+    are decompressed as they are read, without a separate pass.
+    """
+    with ExitStack() as stack:
+        raw_file = stack.enter_context(open(path, "rb", buffering=0))
+        advise_sequential(raw_file)
+        name = str(path).lower()
+        if name.endswith(".gz"):
+            compressed = stack.enter_context(io.BufferedReader(raw_file, block_size))
+            yield stack.enter_context(gzip.GzipFile(fileobj=compressed, mode="rb"))
+        elif name.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("Reading .enex.zst exports needs the zstandard package")
+            decompressed = zstandard.ZstdDecompressor().stream_reader(raw_file, read_size=block_size)
+            yield stack.enter_context(io.BufferedReader(decompressed, block_size))
+        else:
+            yield stack.enter_context(io.BufferedReader(raw_file, block_size))
+
+def advise_sequential(f):
+    if not hasattr(os, "posix_fadvise"): # Not available on macOS and Windows
+        return
+    try:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    except OSError as e:
+        logger.debug(f"Couldn't advise sequential reads: {e}")
+
+def is_compressed(path):
+    return str(path).lower().endswith(COMPRESSED_SUFFIXES)
+
+def get_export_name(path):
+    """
+    The export's file name without .enex and any compression suffix.
+    """
+    name = os.path.basename(str(path))
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    if name.lower().endswith(".enex"):
+        name = name[:-len(".enex")]
+    return name
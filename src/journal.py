@@ -0,0 +1,68 @@
+import logging
+import json
+import os
+from pathlib import Path
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+class Journal:
+    """
+    Append-only JSON Lines file of the changes made to some saved state
+    since it was last saved whole. Checkpoints append only what changed
+    since the one before, so their cost doesn't grow with the size of the
+    export. Whoever owns the state replays the journal after loading it,
+    and removes the journal once the state is saved whole again.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.pending = []
+
+    def add(self, entry):
+        self.pending.append(entry)
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            for entry in self.pending:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        self.pending = []
+
+    def size(self):
+        """
+        The size of the journal on disk, for replaying it up to this point.
+        """
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def read(self, size=None):
+        """
+        Returns the entries in the journal, or in its first size bytes.
+        A last line cut short by a crash is ignored.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read() if size is None else f.read(size)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError as e:
+                logger.warning(f"Ignoring the rest of unreadable journal {self.path}: {e}")
+                break
+        return entries
+
+    def truncate(self, size):
+        if self.path.exists():
+            os.truncate(self.path, size)
+
+    def remove(self):
+        self.pending = []
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,66 @@
+import sys
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+def reset_peak_rss():
+    """
+    Starts measuring the peak resident set size afresh so peak_rss_bytes
+    only covers what comes after, e.g. one conversion in a reused worker.
+    Only Linux allows this. Returns False if the peak stays the peak of the
+    whole process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process in bytes since it
+    started or reset_peak_rss was last called, or None if the platform
+    doesn't expose it.
+    """
+    peak = read_proc_status_peak()
+    if peak is not None:
+        return peak
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak # macOS reports bytes
+    return peak * 1024 # Linux reports kilobytes
+
+def read_proc_status_peak():
+    # getrusage isn't reset by reset_peak_rss, VmHWM is
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024 # Always kB
+    except OSError:
+        pass
+    return None
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return "unknown"
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+def parse_size(size_str):
+    """
+    Parses a size such as 512K, 4M or 1G into bytes.
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    size_str = size_str.strip().upper().rstrip("B").rstrip("I")
+    if size_str[-1:] in units:
+        return int(float(size_str[:-1]) * units[size_str[-1]])
+    return int(size_str)
@@ -0,0 +1,125 @@
+import logging
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from journal import Journal
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+REGISTRY_FILENAME = ".enex2markdown-names.json"
+REGISTRY_VERSION = 1
+JOURNAL_SUFFIX = ".journal"
+
+class NamingRegistry:
+    """
+    Hands out unique output names for notes. Notes are named after the
+    second they were created in, so when several notes share a second the
+    later ones get a -2, -3... suffix. Which note got which suffix is kept in
+    memory and, when output_dir is given, saved there, so the names stay the
+    same when the export is converted again. Nothing is looked up on disk.
+
+    Notes are told apart by their title. Notes created in the same second
+    with the same title are told apart by their order in the export.
+    """
+    def __init__(self, output_dir=None, read_only=False):
+        self.path = Path(output_dir, REGISTRY_FILENAME) if output_dir is not None else None
+        self.read_only = read_only # Loaded but never saved
+        self.names = {} # Base name -> identities of the notes using it, in suffix order
+        self.assigned = set() # (base name, identity) handed out in this run
+        self.changed = False
+        self.journal = Journal(self.path.with_name(self.path.name + JOURNAL_SUFFIX)) if self.path is not None else None
+        self.journaling = False # Changes go to the journal once a checkpoint was made
+        self.load()
+
+    def load(self):
+        if self.path is None:
+            return
+        saved = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable name registry {self.path}: {e}")
+        if saved.get("version") == REGISTRY_VERSION:
+            self.names = saved["names"]
+        # Names handed out after the last checkpoint of a conversion that
+        # didn't finish
+        for base_name, identity in self.journal.read():
+            identities = self.names.setdefault(base_name, [])
+            if identity not in identities:
+                identities.append(identity)
+                self.changed = True
+
+    def save(self):
+        if self.path is None or self.read_only or not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": REGISTRY_VERSION, "names": self.names}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.journal.remove()
+        self.changed = False
+
+    def checkpoint(self):
+        """
+        Saves the names handed out since the last checkpoint. The first
+        checkpoint saves them all, later ones only append to a journal.
+        """
+        if self.path is None or self.read_only:
+            return
+        if self.journaling:
+            self.journal.flush()
+        else:
+            self.save()
+            self.journaling = True
+
+    def note_name(self, note, base_name):
+        return self.title_name(note.title, base_name)
+
+    def title_name(self, title, base_name):
+        identity = title_identity(title)
+        occurrence = 2
+        unique_identity = identity
+        while (base_name, unique_identity) in self.assigned:
+            unique_identity = f"{identity}#{occurrence}"
+            occurrence += 1
+        self.assigned.add((base_name, unique_identity))
+        identities = self.names.setdefault(base_name, [])
+        try:
+            index = identities.index(unique_identity)
+        except ValueError:
+            identities.append(unique_identity)
+            index = len(identities) - 1
+            self.changed = True
+            if self.journaling:
+                self.journal.add([base_name, unique_identity])
+        if index == 0:
+            return base_name
+        logger.debug(f"Naming note {title} {base_name}-{index + 1} because another note was created in the same second")
+        return f"{base_name}-{index + 1}"
+
+def title_identity(title):
+    return hashlib.sha1((title or "").encode("utf-8")).hexdigest()[:12]
+
+def unique_resource_names(note):
+    """
+    Resources of one note with the same name get a -2, -3... suffix before
+    the extension. Names are compared ignoring case, as some filesystems do.
+    """
+    used = set()
+    for resource in note.resources:
+        filename = resource.filename
+        stem, dot, extension = filename.rpartition(".")
+        if dot == "":
+            stem, extension = filename, ""
+        suffix = 2
+        while filename.lower() in used:
+            filename = f"{stem}-{suffix}{dot}{extension}"
+            suffix += 1
+        used.add(filename.lower())
+        resource.filename = filename
@@ -5,97 +5,425 @@ from enum import Enum
 from contextlib import contextmanager
 from datetime import datetime
 import base64
+import hashlib
+import io
+import os
+import shutil
 import urllib
 import unicodedata
 import re
 
 from note_listener import NoteListener
 from enml_converter import ENMLConverter
+from conversion_context import ConversionContext
+from timestamps import parse_timestamp, format_timestamp
+from resource_data import Base64StreamDecoder, SPOOL_DIRNAME, remove_spool_dir
+from incremental_manifest import IncrementalManifest
+from export_index import ExportIndex
+from journal import Journal
+from naming_registry import NamingRegistry, unique_resource_names
+from conversion_stats import NullStats
+from output_backend import FileOutput, ThreadedFileOutput, open_archive_output
 
 logger = logging.getLogger("enex2markdown." + __name__)
 
+UNSAFE_FILENAME_CHARACTERS = re.compile(r'[^0-9a-zA-Z_.\s-]')
+# Saved dedup state of a conversion that makes checkpoints
+DEDUP_JOURNAL_FILENAME = ".enex2markdown-dedup.jsonl"
+
 class Note:
+    """
+    Notes use __slots__ because a listener may hold many of them at once.
+    The markdown is converted from the content the first time it's needed
+    and then kept, after which drop_content() can free the ENML.
+    """
+    __slots__ = ("created", "updated", "title", "_content", "_markdown", "tags", "resources", "output_name")
+
     def __init__(self):
         self.created = None
         self.updated = None
         self.title = None
-        self.content = None
+        self._content = None
+        self._markdown = None
         self.tags = []
         self.resources = []
+        self.output_name = None # Set by the NoteWriter, unique within the export
+
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._markdown = None
+
+    @property
+    def markdown(self):
+        return self.get_markdown()
+
+    def get_markdown(self, enml_converter=None):
+        if self._markdown is None and self._content is not None:
+            if enml_converter is None:
+                enml_converter = get_default_enml_converter()
+            self._markdown = enml_converter.to_markdown(self._content)
+        return self._markdown
+
+    def drop_content(self):
+        """
+        Converts the content if that hasn't happened yet and frees the ENML.
+        """
+        self.get_markdown()
+        self._content = None
 
 class NoteResource:
+    __slots__ = ("_data", "decoded_data", "hash", "size", "mime", "filename", "shared_file", "link")
+
     def __init__(self):
-        self.data = None
+        self._data = None
+        self.decoded_data = None # ResourceData filled in by the parser
+        self.hash = None # MD5 of the decoded payload
+        self.size = None # Size of the decoded payload
         self.mime = None
         self.filename = None
+        self.shared_file = None # Set when the same payload was written for an earlier resource
+        self.link = None # URL to link to instead of the filename
+
+    @property
+    def data(self):
+        """
+        The payload as base64 text. Resources from the parser only keep the
+        decoded payload so this re-encodes it, which is only meant for small
+        resources and tests.
+        """
+        if self._data is None and self.decoded_data is not None:
+            return base64.b64encode(self.decoded_data.getvalue()).decode("ascii")
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def has_data(self):
+        """
+        False when only the resource's metadata was parsed.
+        """
+        return self._data is not None or self.decoded_data is not None
+
+_default_enml_converter = None
+
+def get_default_enml_converter():
+    # One per process, for notes converted outside a NoteWriter
+    global _default_enml_converter
+    if _default_enml_converter is None:
+        _default_enml_converter = ENMLConverter()
+    return _default_enml_converter
 
 class NoteWriter(NoteListener):
     class OutputStyle(Enum):
         PATH = 1
         STREAM = 2 # For testing
+        ARCHIVE = 3 # output_obj is a .zip, .tar, .tar.gz or .tar.zst filename
+
+    class ResourceDedup(Enum):
+        SHARED = 1 # Duplicates link to the first file
+        HARDLINK = 2 # Duplicates are hardlinks to the first file
 
-    def __init__(self, output_obj, output_style = OutputStyle.PATH):
+    def __init__(self, output_obj, output_style = OutputStyle.PATH, incremental = False, resource_dedup = None,
+                 io_threads = 0, persistent_names = True, index = False, attachments = None):
         self.output_obj = output_obj
         self.output_style = output_style
+        if output_style == NoteWriter.OutputStyle.ARCHIVE:
+            if resource_dedup == NoteWriter.ResourceDedup.HARDLINK and str(output_obj).lower().endswith(".zip"):
+                raise ValueError("Zip archives can't hold hardlinks, use ResourceDedup.SHARED")
+            # Paths are relative to the root of the archive
+            self.output_dir = Path()
+            self.output = open_archive_output(output_obj)
+        else:
+            self.output_dir = output_obj
+            self.output = ThreadedFileOutput(io_threads) if io_threads > 0 else FileOutput()
+        # Where the parser should spool big attachments, see EnexParser.set_spool_dir
+        self.spool_dir = Path(output_obj, SPOOL_DIRNAME) if output_style == NoteWriter.OutputStyle.PATH else None
+        self.resource_dedup = resource_dedup
+        self.resource_files_by_hash = {}
+        self.pending_hardlinks = []
+        # Dedup state saved for checkpoints, see get_state
+        self.dedup_journal = None
+        if resource_dedup is not None and output_style == NoteWriter.OutputStyle.PATH:
+            self.dedup_journal = Journal(Path(output_obj, DEDUP_JOURNAL_FILENAME))
+        self.dedup_journaling = False
+        self.context = ConversionContext()
+        self.year_dirs = {}
+        self.stats = NullStats()
+        # Names are only saved with a directory, archives are always written whole.
+        # Conversions of part of the export use the saved names but don't save.
+        self.names = NamingRegistry(output_obj if output_style == NoteWriter.OutputStyle.PATH else None,
+                                    read_only=not persistent_names)
+        self.manifest = None
+        if incremental:
+            assert output_style == NoteWriter.OutputStyle.PATH
+            # attachments is the EnexParser.Attachments the notes are parsed with
+            self.manifest = IncrementalManifest(output_obj, attachments.name if attachments is not None else "ALL")
+        self.index = None
+        if index:
+            assert output_style == NoteWriter.OutputStyle.PATH
+            self.index = ExportIndex(output_obj, incremental)
+
+    def __getstate__(self):
+        # Worker processes only write notes, the manifest stays with the parser
+        state = self.__dict__.copy()
+        state["manifest"] = None
+        state["index"] = None
+        state["names"] = None # Notes are named before they are sent to a worker
+        state["stats"] = NullStats()
+        del state["context"] # Parsers can't be pickled
+        del state["output"] # Workers are already concurrent so they write directly
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.context = ConversionContext()
+        self.output = FileOutput()
+
+    def skip_note(self, note):
+        if self.manifest is None or not self.manifest.is_up_to_date(note):
+            return False
+        if self.index is not None:
+            self.index.add_unchanged(note)
+        return True
 
     def add_note(self, note):
+        self.prepare_note(note)
+        self.note_written(note, self.write_note(note))
+
+    def prepare_note(self, note):
+        """
+        Steps that have to run in the parser's process, in document order.
+        """
+        if self.writes_files():
+            note.output_name = self.names.note_name(note, format_timestamp(note.created).compact)
         fix_resource_names(note)
-        convert_content_to_markdown(note)
-        with self.output_stream(note) as f:
-            write_title(f, note)
-            write_content(f, note)
-            write_created(f, note)
-            write_updated(f, note)
-            write_tags(f, note)
-            write_resources(f, note)
-        self.write_resource_files(note)
+        if self.resource_dedup is not None and self.writes_files():
+            self.dedup_resources(note)
+
+    def name_earlier_notes(self, headers):
+        """
+        When only part of the export is converted, names the notes before
+        it from their (title, created) headers, so the notes converted get
+        the same names as in a conversion of the whole export.
+        """
+        if not self.writes_files():
+            return
+        for title, created in headers:
+            try:
+                created = parse_timestamp(created)
+            except (TypeError, ValueError):
+                continue # The note couldn't be named in a whole conversion either
+            self.names.title_name(title, format_timestamp(created).compact)
+
+    def dedup_resources(self, note):
+        for resource in note.resources:
+            if not resource.has_data():
+                continue
+            filename = self.get_resource_output_filename(note, resource)
+            resource_hash = get_resource_hash(resource)
+            shared_file = self.resource_files_by_hash.setdefault(resource_hash, filename)
+            if shared_file == filename:
+                if self.manifest is not None:
+                    self.manifest.resource_file_written(filename, resource_hash)
+                if self.dedup_journaling:
+                    self.dedup_journal.add(["file", resource_hash, self.relative_path(filename)])
+                continue
+            logger.debug(f"{filename} is a duplicate of {shared_file}")
+            resource.shared_file = shared_file
+            if self.resource_dedup == NoteWriter.ResourceDedup.SHARED:
+                resource.link = Path(os.path.relpath(shared_file, filename.parent)).as_posix()
+            else:
+                # Made at the end because the first file may still be being
+                # written by another process
+                self.pending_hardlinks.append((shared_file, filename))
+                if self.dedup_journaling:
+                    self.dedup_journal.add(["link", self.relative_path(shared_file), self.relative_path(filename)])
+
+    def write_note(self, note):
+        """
+        Converts and writes a prepared note. This doesn't depend on any other
+        note so it can run in a worker process. Returns the files written.
+        """
+        with self.stats.timer("io"):
+            filename = self.get_output_filename(note) if self.writes_files() else None
+            with self.output_stream(filename) as f:
+                write_title(f, note)
+                with self.stats.timer("convert"):
+                    write_content(f, note, self.context)
+                write_created(f, note)
+                write_updated(f, note)
+                write_tags(f, note)
+                write_resources(f, note)
+            files = [filename] if filename is not None else []
+            return files + self.write_resource_files(note)
+
+    def note_written(self, note, files):
+        if self.manifest is not None:
+            resource_files = None
+            if self.resource_dedup is not None:
+                resource_files = [(self.get_resource_file(note, resource), resource.hash)
+                                  for resource in note.resources if resource.has_data()]
+            self.manifest.record(note, files, resource_files)
+        if self.index is not None:
+            self.index.add(note, self.get_output_filename(note),
+                           [self.get_resource_file(note, resource) for resource in note.resources])
+
+    def flush(self):
+        """
+        Waits until every note added so far has been written.
+        """
+        self.output.flush()
+        self.names.checkpoint()
+        if self.manifest is not None:
+            self.manifest.checkpoint()
+        if self.index is not None:
+            self.index.flush()
+
+    def get_state(self):
+        """
+        What a later run needs to carry on after the notes added so far, as
+        JSON-compatible data. Growing state is kept in journals in the
+        output directory and the state only says how much of them to use,
+        so it stays small however many notes there are.
+        """
+        if self.dedup_journal is not None:
+            if not self.dedup_journaling:
+                # Everything so far once, from then on only what's new
+                self.dedup_journal.remove()
+                for resource_hash, filename in self.resource_files_by_hash.items():
+                    self.dedup_journal.add(["file", resource_hash, self.relative_path(filename)])
+                for shared_file, filename in self.pending_hardlinks:
+                    self.dedup_journal.add(["link", self.relative_path(shared_file), self.relative_path(filename)])
+                self.dedup_journaling = True
+            self.dedup_journal.flush()
+        return {
+            "dedup_journal_size": self.dedup_journal.size() if self.dedup_journal is not None else 0,
+            "index_size": self.index.get_size() if self.index is not None else 0,
+        }
+
+    def set_state(self, state):
+        if self.dedup_journal is not None:
+            size = state.get("dedup_journal_size", 0)
+            entries = self.dedup_journal.read(size)
+            self.dedup_journal.truncate(size)
+            for kind, first, second in entries:
+                if kind == "file":
+                    self.resource_files_by_hash[first] = Path(self.output_dir, second)
+                else:
+                    self.pending_hardlinks.append((Path(self.output_dir, first), Path(self.output_dir, second)))
+            self.dedup_journaling = True
+        if self.spool_dir is not None:
+            # Payloads the interrupted run spooled were never moved into place
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+        if self.index is not None:
+            self.index.resume(state.get("index_size", 0))
+
+    def relative_path(self, filename):
+        return Path(filename).relative_to(self.output_dir).as_posix()
+
+    def close(self):
+        try:
+            self.output.flush()
+            for shared_file, filename in self.pending_hardlinks:
+                self.output.link(shared_file, filename)
+            self.pending_hardlinks = []
+            if self.dedup_journal is not None:
+                self.dedup_journal.remove()
+            if self.index is not None:
+                self.index.close()
+        finally:
+            self.output.close()
+            if self.spool_dir is not None:
+                remove_spool_dir(self.spool_dir)
+            self.names.save()
+            if self.manifest is not None:
+                # Notes whose files failed must be written again next time
+                self.manifest.forget_files(self.output.failed_files)
+                self.manifest.save()
+
+    def writes_files(self):
+        return self.output_style in (NoteWriter.OutputStyle.PATH, NoteWriter.OutputStyle.ARCHIVE)
 
     @contextmanager
-    def output_stream(self, note):
-        if self.output_style == NoteWriter.OutputStyle.PATH:
-            filename = self.get_output_filename(note)
-            self.create_outputfile_dir(filename)
-            logger.debug(f"Writing file: {filename}")
-            f = open(filename, "w", encoding="utf-8")
+    def output_stream(self, filename):
+        if filename is not None:
+            # Notes are built in memory and handed to the output as one write
+            f = io.StringIO()
             yield f
-            f.close()
+            logger.debug(f"Writing file: {filename}")
+            self.output.write_text(filename, f.getvalue())
         else:
             yield self.output_obj
 
     def get_output_filename(self, note):
-        return Path(self.output_obj, str(note.created.year), f"{note.created.strftime('%Y%m%dT%H%M%SZ')}.md")
+        created = format_timestamp(note.created)
+        return self.get_year_dir(created) / f"{note.output_name or created.compact}.md"
 
-    def create_outputfile_dir(self, filename):
-        filename.parent.mkdir(parents=True, exist_ok=True)
+    def get_year_dir(self, created):
+        year_dir = self.year_dirs.get(created.year)
+        if year_dir is None:
+            year_dir = self.year_dirs[created.year] = Path(self.output_dir, created.year)
+        return year_dir
 
     def write_resource_files(self, note):
+        files = []
         for resource in note.resources:
-            with self.resource_output_stream(note, resource) as f:
-                if f is not None:
-                    f.write(base64.b64decode(resource.data))
+            if not resource.has_data():
+                continue
+            if resource.shared_file is None and self.writes_files():
+                filename = self.get_resource_output_filename(note, resource)
+                logger.debug(f"Writing file: {filename}")
+                # The output discards the payload once it's written
+                self.output.write_resource(filename, resource)
+                files.append(filename)
+                continue
+            if resource.shared_file is not None and self.resource_dedup == NoteWriter.ResourceDedup.HARDLINK:
+                files.append(self.get_resource_output_filename(note, resource))
+            if resource.decoded_data is not None:
+                resource.decoded_data.discard()
+        return files
 
-    @contextmanager
-    def resource_output_stream(self, note, resource):
-        if self.output_style == NoteWriter.OutputStyle.PATH:
-            filename = self.get_resource_output_filename(note, resource)
-            self.create_outputfile_dir(filename)
-            logger.debug(f"Writing file: {filename}")
-            f = open(filename, "wb")
-            yield f
-            f.close()
-        else:
-            yield None # Resources can't be streamed
+    def get_resource_file(self, note, resource):
+        """
+        The file a resource's link points to, if it has one.
+        """
+        if not resource.has_data():
+            return None
+        if resource.shared_file is not None and self.resource_dedup == NoteWriter.ResourceDedup.SHARED:
+            return resource.shared_file
+        return self.get_resource_output_filename(note, resource)
 
     def get_resource_output_filename(self, note, resource):
-        return Path(self.output_obj, str(note.created.year), resource.filename)
+        return self.get_year_dir(format_timestamp(note.created)) / resource.filename
 
+def get_resource_hash(resource):
+    if resource.hash is None and resource.data is not None:
+        decoder = Base64StreamDecoder(HashWriter())
+        decoder.feed(resource.data)
+        decoder.close()
+        resource.hash = decoder.output.digest.hexdigest()
+    return resource.hash
+
+class HashWriter:
+    def __init__(self):
+        self.digest = hashlib.md5(usedforsecurity=False)
+
+    def write(self, data):
+        self.digest.update(data)
 
 def fix_resource_names(note):
     if len(note.resources) > 0:
-        resource_prefix = note.created.strftime('%Y%m%dT%H%M%SZ') + "-"
+        resource_prefix = (note.output_name or format_timestamp(note.created).compact) + "-"
         for idx, resource in enumerate(note.resources):
             resource.filename = prefix_resource_name(resource_prefix, idx, resource)
             resource.filename = normalize_filename(resource.filename)
+        unique_resource_names(note)
 
 def prefix_resource_name(resource_prefix, idx, resource):
     if resource.filename is None or len(resource.filename.strip()) == 0:
@@ -106,28 +434,25 @@ def prefix_resource_name(resource_prefix, idx, resource):
 def normalize_filename(filename):
     normalized_filename = unicodedata.normalize('NFKD', filename)
     normalized_filename = normalized_filename.encode(encoding="ascii", errors="ignore").decode(encoding="ascii")
-    return re.sub(r'[^0-9a-zA-Z_.\s-]', r'-', normalized_filename)
-
-def convert_content_to_markdown(note):
-    if note.content is not None:
-        enml_converter = ENMLConverter()
-        note.content = enml_converter.to_markdown(note.content)
+    return UNSAFE_FILENAME_CHARACTERS.sub('-', normalized_filename)
 
 def write_title(f, note):
     if note.title is not None:
         f.write(f"# {note.title}\n\n")
 
-def write_content(f, note):
-    if note.content is not None:
-        f.write(f"{note.content}\n")
+def write_content(f, note, context):
+    markdown = note.get_markdown(context.enml_converter)
+    if markdown is not None:
+        f.write(markdown)
+        f.write("\n")
 
 def write_created(f, note):
     if note.created is not None:
-        f.write(f"Created: {note.created.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"Created: {format_timestamp(note.created).display}\n\n")
 
 def write_updated(f, note):
     if note.updated is not None:
-        f.write(f"Updated: {note.updated.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"Updated: {format_timestamp(note.updated).display}\n\n")
 
 def write_tags(f, note):
     if len(note.tags) > 0:
@@ -139,12 +464,20 @@ def write_resources(f, note):
         write_resource(f, resource)
 
 def write_resource(f, resource):
-    write_resource_link(f, resource)
+    if resource.has_data():
+        write_resource_link(f, resource)
+    else:
+        write_resource_metadata(f, resource)
 
 def write_resource_link(f, resource):
     if resource.filename is not None:
         img_md = ""
         if "image" in resource.mime:
             img_md = "!"
-        url = urllib.parse.quote(resource.filename)
+        url = urllib.parse.quote(resource.link or resource.filename)
         f.write(f"{img_md}[{resource.filename}]({url})\n\n")
+
+def write_resource_metadata(f, resource):
+    # There is no file to link to
+    if resource.filename is not None:
+        f.write(f"Attachment: {resource.filename} ({resource.mime}, {resource.size} bytes, md5 {resource.hash})\n\n")
@@ -0,0 +1,58 @@
+import logging
+import re
+from datetime import date, datetime, time, timezone
+
+from timestamps import parse_timestamp
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+class NoteFilter:
+    """
+    Which notes to convert. A note has to have one of tags (if any are given),
+    a created or updated time (date_field) from since up to but not
+    including until, and a title that title_pattern matches. Notes without
+    an updated time are filtered on their created time.
+    """
+    def __init__(self, tags=None, since=None, until=None, date_field="created", title_pattern=None):
+        self.tags = {tag.casefold() for tag in tags} if tags else None
+        self.since = since
+        self.until = until
+        self.date_field = date_field
+        self.title_pattern = re.compile(title_pattern) if title_pattern is not None else None
+
+    def matches(self, note):
+        if self.title_pattern is not None and self.title_pattern.search(note.title or "") is None:
+            return False
+        if self.since is not None or self.until is not None:
+            date = note.updated if self.date_field == "updated" and note.updated is not None else note.created
+            if date is None or not self.in_date_range(date):
+                return False
+        if self.tags is not None and self.tags.isdisjoint(tag.casefold() for tag in note.tags):
+            return False
+        return True
+
+    def rules_out(self, note):
+        """
+        Whether a note that is still being parsed can already be filtered out
+        on the fields read so far. The title comes before the content in an
+        export, the times and tags usually after it, and fields that haven't
+        been read yet don't rule a note out.
+        """
+        if self.title_pattern is not None and note.title is not None and self.title_pattern.search(note.title) is None:
+            return True
+        # Without an updated time yet, created only stands in for it if the
+        # note turns out not to have one
+        date = note.updated if self.date_field == "updated" else note.created
+        return date is not None and not self.in_date_range(date)
+
+    def in_date_range(self, date):
+        return (self.since is None or date >= self.since) and (self.until is None or date < self.until)
+
+def parse_filter_date(date_str):
+    """
+    Accepts a date like 2019-01-01 or any timestamp parse_timestamp does.
+    Times without a timezone are UTC, like the times in the export.
+    """
+    if "T" in date_str:
+        return parse_timestamp(date_str)
+    return datetime.combine(date.fromisoformat(date_str), time(), tzinfo=timezone.utc)
@@ -0,0 +1,181 @@
+import logging
+import html
+import json
+import mmap
+import os
+import re
+from pathlib import Path
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+INDEX_SUFFIX = ".noteindex.json"
+INDEX_VERSION = 2
+NOTE_TAG_PATTERN = re.compile(rb"<note>|</note>")
+EXPORT_PREFIX = b'<?xml version="1.0" encoding="UTF-8"?>\n<en-export>\n'
+EXPORT_SUFFIX = b'\n</en-export>\n'
+READ_BLOCK_SIZE = 1024 * 1024
+
+class NoteIndex:
+    """
+    Byte offsets of every <note>...</note> span in an ENEX file, along with
+    the note titles and created timestamps. The index is saved to a sidecar file next to the export
+    and is reused as long as the export's size and mtime don't change.
+
+    The scan looks for the literal <note> and </note> tags. Note content is
+    ENML inside CDATA, which never contains those tags, so this is enough to
+    find the notes without parsing the XML.
+    """
+    def __init__(self, xml_path, file_size, file_mtime_ns, spans):
+        self.xml_path = Path(xml_path)
+        self.file_size = file_size
+        self.file_mtime_ns = file_mtime_ns
+        self.spans = spans # List of [start, end, title, created]
+
+    @classmethod
+    def build(cls, xml_path):
+        stat = os.stat(xml_path)
+        spans = []
+        if stat.st_size > 0:
+            with open(xml_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = None
+                for match in NOTE_TAG_PATTERN.finditer(mm):
+                    if match.group() == b"<note>":
+                        start = match.start()
+                    elif start is not None:
+                        spans.append([start, match.end(), find_element_text(mm, start, match.end(), b"title"),
+                                      find_element_text(mm, start, match.end(), b"created")])
+                        start = None
+        logger.info(f"Indexed {len(spans)} notes in {xml_path}")
+        return cls(xml_path, stat.st_size, stat.st_mtime_ns, spans)
+
+    @classmethod
+    def load(cls, xml_path):
+        index_path = get_index_path(xml_path)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(xml_path)
+        if saved.get("version") != INDEX_VERSION or saved.get("size") != stat.st_size \
+                or saved.get("mtime_ns") != stat.st_mtime_ns:
+            logger.info(f"Ignoring out of date note index {index_path}")
+            return None
+        return cls(xml_path, saved["size"], saved["mtime_ns"], saved["notes"])
+
+    @classmethod
+    def load_or_build(cls, xml_path):
+        index = cls.load(xml_path)
+        if index is None:
+            index = cls.build(xml_path)
+            index.save()
+        return index
+
+    def save(self):
+        index_path = get_index_path(self.xml_path)
+        try:
+            with open(index_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": INDEX_VERSION,
+                    "size": self.file_size,
+                    "mtime_ns": self.file_mtime_ns,
+                    "notes": self.spans,
+                }, f)
+        except OSError as e:
+            logger.warning(f"Couldn't save note index {index_path}: {e}")
+
+    def __len__(self):
+        return len(self.spans)
+
+    def find_title(self, title):
+        for ordinal, span in enumerate(self.spans):
+            if span[2] == title:
+                return ordinal
+        return None
+
+    def shard(self, shard_index, shard_count):
+        """
+        Returns the (start, stop) note ordinals of one of shard_count
+        contiguous shards. Shards are balanced by bytes rather than note
+        count so notes with big attachments don't all land in one shard.
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard {shard_index} is out of range for {shard_count} shards")
+        if len(self.spans) == 0:
+            return (0, 0)
+        first_byte = self.spans[0][0]
+        total_bytes = self.spans[-1][1] - first_byte
+        boundaries = []
+        ordinal = 0
+        for i in range(shard_count + 1):
+            target = first_byte + total_bytes * i // shard_count
+            while ordinal < len(self.spans) and self.spans[ordinal][0] < target:
+                ordinal += 1
+            boundaries.append(ordinal)
+        boundaries[-1] = len(self.spans)
+        return (boundaries[shard_index], boundaries[shard_index + 1])
+
+    def headers(self, start, stop):
+        """
+        The (title, created) of notes start to stop-1, as the raw text of
+        the elements.
+        """
+        return [(span[2], span[3]) for span in self.spans[start:stop]]
+
+    def open_notes(self, start, stop):
+        """
+        Returns a file-like object holding notes start to stop-1 wrapped in an
+        <en-export> element, which EnexParser.parseNoteXML accepts.
+        """
+        if start >= stop:
+            return NoteSpanReader(self.xml_path, 0, 0)
+        return NoteSpanReader(self.xml_path, self.spans[start][0], self.spans[stop - 1][1])
+
+class NoteSpanReader:
+    def __init__(self, xml_path, start, end):
+        self.f = open(xml_path, "rb")
+        self.f.seek(start)
+        self.remaining = end - start
+        self.prefix = EXPORT_PREFIX
+        self.suffix = EXPORT_SUFFIX
+        self.size = len(self.prefix) + self.remaining + len(self.suffix)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_BLOCK_SIZE
+        if len(self.prefix) > 0:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            return data
+        if self.remaining > 0:
+            data = self.f.read(min(size, self.remaining))
+            self.remaining -= len(data)
+            if len(data) > 0:
+                return data
+            self.remaining = 0
+        data, self.suffix = self.suffix[:size], self.suffix[size:]
+        return data
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+def get_index_path(xml_path):
+    xml_path = Path(xml_path)
+    return xml_path.with_name(xml_path.name + INDEX_SUFFIX)
+
+def find_element_text(mm, start, end, tag):
+    # Only for the note's own elements, which come before its content
+    start_tag = b"<" + tag + b">"
+    text_start = mm.find(start_tag, start, end)
+    if text_start < 0:
+        return None
+    text_start += len(start_tag)
+    text_end = mm.find(b"</" + tag + b">", text_start, end)
+    if text_end < 0:
+        return None
+    return html.unescape(mm[text_start:text_end].decode("utf-8", errors="replace"))
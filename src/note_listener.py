@@ -6,5 +6,25 @@ class NoteListener:
     def __init__(self):
         self.notes = []
 
+    def skip_note(self, note):
+        """
+        Called before the note's resources are parsed. Returning True skips
+        decoding the resources and the note is never passed to add_note.
+        """
+        return False
+
     def add_note(self, note):
         self.notes.append(note)
+
+    def note_filtered_out(self, note):
+        """
+        Called instead of skip_note and add_note for notes the parser's
+        NoteFilter excluded. Only the note's header has been parsed.
+        """
+        pass
+
+    def close(self):
+        """
+        Called once there are no more notes to add.
+        """
+        pass
@@ -0,0 +1,233 @@
+import logging
+import io
+import os
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import zstandard
+except ImportError: # Only needed for .tar.zst archives
+    zstandard = None
+
+from resource_data import Base64StreamDecoder
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+class FileOutput:
+    """
+    Writes output files as soon as they are handed over. Directories that
+    have already been created are remembered so each one is only made once.
+    """
+    def __init__(self):
+        self.created_dirs = set()
+        self.failed_files = set()
+
+    def write_text(self, filename, text):
+        self.make_parent_dir(filename)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def write_resource(self, filename, resource):
+        try:
+            self.make_parent_dir(filename)
+            if resource.decoded_data is not None and resource.decoded_data.move_to(filename):
+                return
+            # Replaced rather than overwritten, so a hardlink to the old file
+            # made for a duplicate in another note keeps the old payload
+            tmp_filename = filename.with_name(f".{filename.name}.tmp")
+            try:
+                with open(tmp_filename, "wb") as f:
+                    write_resource_data(f, resource)
+                os.replace(tmp_filename, filename)
+            except BaseException:
+                tmp_filename.unlink(missing_ok=True)
+                raise
+        finally:
+            if resource.decoded_data is not None:
+                resource.decoded_data.discard()
+
+    def link(self, shared_file, filename):
+        filename.unlink(missing_ok=True)
+        try:
+            os.link(shared_file, filename)
+        except OSError as e:
+            # Not every filesystem supports hardlinks
+            logger.debug(f"Copying {shared_file} to {filename} because it can't be hardlinked: {e}")
+            shutil.copyfile(shared_file, filename)
+
+    def make_parent_dir(self, filename):
+        parent = filename.parent
+        if parent not in self.created_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            self.created_dirs.add(parent)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class ThreadedFileOutput(FileOutput):
+    """
+    Writes output files from a pool of background threads so the parser
+    doesn't wait on the filesystem. At most max_pending writes are queued;
+    beyond that the caller blocks until one finishes. Errors are logged as
+    they are found and the first one is raised by flush() or close().
+    """
+    def __init__(self, threads, max_pending=None):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="enex2markdown-output")
+        self.max_pending = max_pending if max_pending is not None else threads * 8
+        self.pending = threading.BoundedSemaphore(self.max_pending)
+        self.futures = {} # Future -> filename, only touched by the calling thread
+        self.errors = []
+
+    def write_text(self, filename, text):
+        self.submit(filename, super().write_text, filename, text)
+
+    def write_resource(self, filename, resource):
+        self.submit(filename, super().write_resource, filename, resource)
+
+    def submit(self, filename, write_function, *args):
+        self.pending.acquire()
+        future = self.executor.submit(write_function, *args)
+        future.add_done_callback(lambda _done: self.pending.release())
+        self.futures[future] = filename
+        if len(self.futures) > 2 * self.max_pending:
+            # At most max_pending are still running, the rest can be checked
+            self.collect_done()
+
+    def collect_done(self):
+        for future in [future for future in self.futures if future.done()]:
+            filename = self.futures.pop(future)
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Failed to write {filename}: {error}")
+                self.errors.append(error)
+                self.failed_files.add(filename)
+
+    def flush(self):
+        wait(list(self.futures))
+        self.collect_done()
+        if len(self.errors) > 0:
+            error = self.errors[0]
+            logger.error(f"{len(self.errors)} output files couldn't be written")
+            self.errors = []
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+class ZipOutput:
+    """
+    Writes every output file into one zip archive. Entries are streamed in
+    so resource payloads are never held in memory.
+    """
+    def __init__(self, filename):
+        self.zip_file = zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_DEFLATED)
+        self.failed_files = set()
+
+    def write_text(self, filename, text):
+        self.zip_file.writestr(get_member_name(filename), text.encode("utf-8"))
+
+    def write_resource(self, filename, resource):
+        try:
+            with self.zip_file.open(get_member_name(filename), "w", force_zip64=True) as f:
+                write_resource_data(f, resource)
+        finally:
+            if resource.decoded_data is not None:
+                resource.decoded_data.discard()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.zip_file.close()
+
+class TarOutput:
+    """
+    Writes every output file into one tar archive, optionally compressed with
+    gzip or zstd. The archive is written as a stream so it never seeks.
+    """
+    def __init__(self, filename, compression=""):
+        self.raw_file = None
+        self.zstd_writer = None
+        if compression == "zst":
+            if zstandard is None:
+                raise RuntimeError("Writing .tar.zst archives needs the zstandard package")
+            self.raw_file = open(filename, "wb")
+            self.zstd_writer = zstandard.ZstdCompressor().stream_writer(self.raw_file)
+            self.tar_file = tarfile.open(fileobj=self.zstd_writer, mode="w|")
+        else:
+            self.tar_file = tarfile.open(str(filename), mode=f"w|{compression}")
+        self.mtime = time.time()
+        self.failed_files = set()
+
+    def write_text(self, filename, text):
+        data = text.encode("utf-8")
+        self.tar_file.addfile(self.make_tarinfo(filename, len(data)), io.BytesIO(data))
+
+    def write_resource(self, filename, resource):
+        try:
+            if resource.decoded_data is not None:
+                with resource.decoded_data.open() as f:
+                    self.tar_file.addfile(self.make_tarinfo(filename, resource.decoded_data.size), f)
+            elif resource.data is not None:
+                # Only resources created without the parser have no decoded payload
+                data = io.BytesIO()
+                write_resource_data(data, resource)
+                self.tar_file.addfile(self.make_tarinfo(filename, data.tell()), io.BytesIO(data.getvalue()))
+        finally:
+            if resource.decoded_data is not None:
+                resource.decoded_data.discard()
+
+    def link(self, shared_file, filename):
+        tarinfo = self.make_tarinfo(filename, 0)
+        tarinfo.type = tarfile.LNKTYPE
+        tarinfo.linkname = get_member_name(shared_file)
+        self.tar_file.addfile(tarinfo)
+
+    def make_tarinfo(self, filename, size):
+        tarinfo = tarfile.TarInfo(get_member_name(filename))
+        tarinfo.size = size
+        tarinfo.mtime = self.mtime
+        tarinfo.mode = 0o644
+        return tarinfo
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.tar_file.close()
+        if self.zstd_writer is not None:
+            self.zstd_writer.close()
+
+def open_archive_output(filename):
+    name = str(filename).lower()
+    if name.endswith(".zip"):
+        return ZipOutput(filename)
+    if name.endswith(".tar"):
+        return TarOutput(filename)
+    if name.endswith(".tar.gz") or name.endswith(".tgz"):
+        return TarOutput(filename, "gz")
+    if name.endswith(".tar.zst") or name.endswith(".tzst"):
+        return TarOutput(filename, "zst")
+    raise ValueError(f"Unknown archive type: {filename}. Use .zip, .tar, .tar.gz or .tar.zst")
+
+def get_member_name(filename):
+    return filename.as_posix()
+
+def write_resource_data(f, resource):
+    if resource.decoded_data is not None:
+        resource.decoded_data.save(f)
+    elif resource.data is not None:
+        decoder = Base64StreamDecoder(f)
+        decoder.feed(resource.data)
+        decoder.close()
@@ -0,0 +1,65 @@
+import logging
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+
+from note_listener import NoteListener
+from note import NoteWriter
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+# Each worker process gets its own copy of the NoteWriter
+_worker_note_writer = None
+
+def init_worker(note_writer):
+    global _worker_note_writer
+    _worker_note_writer = note_writer
+
+def write_note_in_worker(note):
+    return _worker_note_writer.write_note(note)
+
+class ParallelNoteWriter(NoteListener):
+    """
+    Hands notes from the parser to a pool of worker processes that do the
+    ENML conversion and file writes. At most max_pending notes are in flight
+    so a parser that is faster than the writers doesn't fill up memory.
+    """
+    def __init__(self, note_writer, jobs, max_pending=None):
+        if note_writer.output_style != NoteWriter.OutputStyle.PATH:
+            raise ValueError("Only notes written to a directory can be written in parallel")
+        self.note_writer = note_writer
+        self.max_pending = max_pending if max_pending is not None else jobs * 2
+        self.pending = {} # Future -> note
+        self.executor = ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(note_writer,))
+
+    def skip_note(self, note):
+        return self.note_writer.skip_note(note)
+
+    def add_note(self, note):
+        self.note_writer.prepare_note(note)
+        while len(self.pending) >= self.max_pending:
+            self.wait_pending(FIRST_COMPLETED)
+        self.pending[self.executor.submit(write_note_in_worker, note)] = note
+
+    def wait_pending(self, return_when):
+        done, _not_done = wait(self.pending, return_when=return_when)
+        for future in done:
+            note = self.pending.pop(future)
+            # Raises any error from the worker
+            self.note_writer.note_written(note, future.result())
+
+    def flush(self):
+        self.wait_pending(ALL_COMPLETED)
+        self.note_writer.flush()
+
+    def get_state(self):
+        return self.note_writer.get_state()
+
+    def set_state(self, state):
+        self.note_writer.set_state(state)
+
+    def close(self):
+        try:
+            self.wait_pending(ALL_COMPLETED)
+        finally:
+            self.executor.shutdown()
+        self.note_writer.close()
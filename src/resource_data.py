@@ -0,0 +1,190 @@
+import logging
+import base64
+import hashlib
+import io
+import os
+import secrets
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+DEFAULT_SPOOL_THRESHOLD = 1024 * 1024
+# Spool directory inside the output directory, so spooled payloads can be
+# renamed into place instead of copied
+SPOOL_DIRNAME = ".enex2markdown-spool"
+# Number of base64 characters decoded at a time. Whitespace is stripped from
+# each chunk before decoding so the size of the decoded block varies a little.
+DECODE_CHUNK_SIZE = 256 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+
+class ResourceData:
+    """
+    The decoded payload of a resource. Payloads up to spool_threshold bytes
+    are kept in memory, anything bigger is spooled to a temporary file so the
+    memory used per attachment doesn't depend on the size of the attachment.
+    Spool files go to spool_dir, or the system's temporary directory if it
+    is None.
+    """
+    def __init__(self, spool_threshold=DEFAULT_SPOOL_THRESHOLD, spool_dir=None):
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir
+        self.buffer = bytearray()
+        self.spool_path = None
+        self.spool_file = None
+        self.size = 0
+        self.digest = hashlib.md5(usedforsecurity=False) # Same hash ENML uses for <en-media>
+
+    def write(self, data):
+        self.size += len(data)
+        self.digest.update(data)
+        if self.spool_file is None and self.spool_path is None and \
+                len(self.buffer) + len(data) > self.spool_threshold:
+            self.start_spool()
+        if self.spool_file is not None:
+            self.spool_file.write(data)
+        else:
+            self.buffer += data
+
+    def start_spool(self):
+        if self.spool_dir is None:
+            # Private, other users can read the system's temporary directory
+            fd, self.spool_path = tempfile.mkstemp(prefix="enex2markdown-", suffix=".spool")
+        else:
+            # Spooled to become an output file, so it gets the mode open()
+            # would give one
+            os.makedirs(self.spool_dir, exist_ok=True)
+            fd, self.spool_path = create_spool_file(self.spool_dir)
+        logger.debug(f"Spooling resource to {self.spool_path}")
+        self.spool_file = os.fdopen(fd, "wb")
+        self.spool_file.write(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        if self.spool_file is not None:
+            self.spool_file.close()
+            self.spool_file = None
+
+    @property
+    def spooled(self):
+        return self.spool_path is not None
+
+    @contextmanager
+    def open(self):
+        self.close()
+        if self.spooled:
+            f = open(self.spool_path, "rb")
+            yield f
+            f.close()
+        else:
+            yield io.BytesIO(self.buffer)
+
+    def getvalue(self):
+        with self.open() as f:
+            return f.read()
+
+    def save(self, f):
+        with self.open() as src:
+            shutil.copyfileobj(src, f, COPY_BUFFER_SIZE)
+
+    def move_to(self, filename):
+        """
+        Renames the spool file to filename. Returns False if the payload
+        isn't spooled to a spool_dir or is on another filesystem, in which
+        case it has to be copied instead.
+        """
+        if not self.spooled or self.spool_dir is None:
+            return False
+        self.close()
+        try:
+            os.replace(self.spool_path, filename)
+        except OSError as e:
+            logger.debug(f"Copying {self.spool_path} to {filename} because it can't be moved: {e}")
+            return False
+        self.spool_path = None
+        return True
+
+    def discard(self):
+        self.close()
+        if self.spool_path is not None:
+            try:
+                os.remove(self.spool_path)
+            except FileNotFoundError:
+                pass
+            self.spool_path = None
+        self.buffer = bytearray()
+
+    def __getstate__(self):
+        # Pickled when a note is sent to a worker process. Spooled payloads
+        # are passed by path and the spool file has to be complete by then.
+        self.close()
+        state = self.__dict__.copy()
+        state["buffer"] = bytes(self.buffer)
+        state["digest"] = None # The payload is complete so the hash isn't needed
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.buffer = bytearray(self.buffer)
+
+    def __del__(self):
+        self.discard()
+
+def create_spool_file(spool_dir):
+    # Like mkstemp, but lets the umask decide the mode like open() does
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    for _attempt in range(tempfile.TMP_MAX):
+        path = os.path.join(spool_dir, f"enex2markdown-{secrets.token_hex(8)}.spool")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free spool file name in {spool_dir}")
+
+def remove_spool_dir(spool_dir):
+    """
+    Removes spool_dir if nothing else is spooling to it.
+    """
+    try:
+        os.rmdir(spool_dir)
+    except OSError: # Missing, or still used by another shard
+        pass
+
+class ResourceDigest:
+    """
+    Stand-in for ResourceData that only keeps the size and hash of a
+    payload, for when the payload itself isn't wanted.
+    """
+    def __init__(self):
+        self.size = 0
+        self.digest = hashlib.md5(usedforsecurity=False)
+
+    def write(self, data):
+        self.size += len(data)
+        self.digest.update(data)
+
+class Base64StreamDecoder:
+    """
+    Decodes base64 text fed in arbitrary pieces and writes the bytes to output
+    without ever holding the whole payload.
+    """
+    def __init__(self, output):
+        self.output = output
+        self.pending = ""
+
+    def feed(self, text):
+        for start in range(0, len(text), DECODE_CHUNK_SIZE):
+            chunk = self.pending + remove_all_whitespace(text[start:start + DECODE_CHUNK_SIZE])
+            usable = len(chunk) - len(chunk) % 4
+            if usable > 0:
+                self.output.write(base64.b64decode(chunk[:usable]))
+            self.pending = chunk[usable:]
+
+    def close(self):
+        if len(self.pending) > 0:
+            self.output.write(base64.b64decode(self.pending))
+            self.pending = ""
+
+def remove_all_whitespace(s):
+    return ''.join(s.split())
@@ -0,0 +1,178 @@
+import logging
+import io
+import sqlite3
+from pathlib import Path
+
+from note_listener import NoteListener
+from conversion_context import ConversionContext
+from timestamps import format_timestamp
+from resource_data import Base64StreamDecoder
+from note import fix_resource_names
+from conversion_stats import NullStats
+
+logger = logging.getLogger("enex2markdown." + __name__)
+
+DEFAULT_BATCH_SIZE = 1000
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    created TEXT,
+    updated TEXT,
+    tags TEXT,
+    markdown TEXT
+);
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id INTEGER NOT NULL REFERENCES notes(id),
+    tag TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY,
+    note_id INTEGER NOT NULL REFERENCES notes(id),
+    filename TEXT,
+    mime TEXT,
+    size INTEGER,
+    hash TEXT,
+    data BLOB
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title, tags, markdown, content='notes', content_rowid='id'
+);
+"""
+# Indexes are created after loading, which is faster than maintaining them
+INDEXES = """
+CREATE INDEX IF NOT EXISTS notes_created ON notes(created);
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags(tag);
+CREATE INDEX IF NOT EXISTS resources_note_id ON resources(note_id);
+CREATE INDEX IF NOT EXISTS resources_hash ON resources(hash);
+"""
+
+class SQLiteNoteWriter(NoteListener):
+    """
+    Loads notes into a SQLite database with a full text index over the
+    titles, tags and markdown. Notes are inserted in transactions of
+    batch_size notes with the database in WAL mode, so loading is limited by
+    I/O rather than by commits. Resource payloads are stored as blobs unless
+    store_resource_data is False, in which case only their metadata is kept.
+
+    Loading the same export twice would store every note twice, so a
+    database that already has notes is refused unless append is True.
+    """
+    def __init__(self, db_filename, batch_size=DEFAULT_BATCH_SIZE, store_resource_data=True, append=False):
+        self.batch_size = batch_size
+        self.store_resource_data = store_resource_data
+        self.context = ConversionContext()
+        self.stats = NullStats()
+        self.connection = sqlite3.connect(db_filename, isolation_level=None)
+        if not append and count_notes(self.connection) > 0:
+            self.connection.close()
+            raise ValueError(f"{db_filename} already has notes. Load into a new database or append to it")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self.connection.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite output needs a SQLite build with FTS5: {e}")
+        self.batch_count = 0
+        self.notes = 0
+
+    def add_note(self, note):
+        if self.batch_count == 0:
+            self.connection.execute("BEGIN")
+        fix_resource_names(note)
+        with self.stats.timer("convert"):
+            markdown = note.get_markdown(self.context.enml_converter)
+        tags = ", ".join(note.tags)
+        cursor = self.connection.execute(
+            "INSERT INTO notes (title, created, updated, tags, markdown) VALUES (?, ?, ?, ?, ?)",
+            (note.title, self.format_datetime(note.created), self.format_datetime(note.updated), tags, markdown))
+        note_id = cursor.lastrowid
+        self.connection.execute(
+            "INSERT INTO notes_fts (rowid, title, tags, markdown) VALUES (?, ?, ?, ?)",
+            (note_id, note.title, tags, markdown))
+        self.connection.executemany("INSERT INTO note_tags (note_id, tag) VALUES (?, ?)",
+                                    [(note_id, tag) for tag in note.tags])
+        for resource in note.resources:
+            self.add_resource(note_id, resource)
+        self.notes += 1
+        self.batch_count += 1
+        if self.batch_count >= self.batch_size:
+            self.commit()
+
+    def add_resource(self, note_id, resource):
+        decoded_data = resource.decoded_data
+        cursor = self.connection.execute(
+            "INSERT INTO resources (note_id, filename, mime, size, hash, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (note_id, resource.filename, resource.mime, resource.size, resource.hash, None))
+        if self.store_resource_data and resource.has_data():
+            self.store_data(cursor.lastrowid, resource)
+        if decoded_data is not None:
+            decoded_data.discard()
+
+    def store_data(self, resource_id, resource):
+        decoded_data = resource.decoded_data
+        if decoded_data is not None and hasattr(self.connection, "blobopen"):
+            # Copy the payload into the blob in chunks so it's never all in memory
+            self.connection.execute("UPDATE resources SET data = zeroblob(?) WHERE id = ?",
+                                    (decoded_data.size, resource_id))
+            with self.connection.blobopen("resources", "data", resource_id) as blob, decoded_data.open() as f:
+                while True:
+                    chunk = f.read(BLOB_CHUNK_SIZE)
+                    if len(chunk) == 0:
+                        break
+                    blob.write(chunk)
+        else:
+            # Python before 3.11 has no incremental blob I/O
+            data = decoded_data.getvalue() if decoded_data is not None else decode_base64(resource.data)
+            if data is not None:
+                self.connection.execute("UPDATE resources SET data = ?, size = ? WHERE id = ?",
+                                        (data, len(data), resource_id))
+
+    def format_datetime(self, value):
+        if value is None:
+            return None
+        return format_timestamp(value).display
+
+    def commit(self):
+        if self.batch_count > 0:
+            self.connection.execute("COMMIT")
+            logger.debug(f"Committed {self.batch_count} notes")
+            self.batch_count = 0
+
+    def close(self):
+        self.commit()
+        self.connection.executescript(INDEXES)
+        self.connection.execute("INSERT INTO notes_fts (notes_fts) VALUES ('optimize')")
+        self.connection.close()
+        logger.info(f"Loaded {self.notes} notes")
+
+def count_notes(connection):
+    try:
+        return connection.execute("SELECT count(*) FROM notes").fetchone()[0]
+    except sqlite3.OperationalError: # No notes table yet
+        return 0
+
+def get_note_count(db_filename):
+    """
+    The number of notes in the database db_filename, 0 if it doesn't exist.
+    Raises sqlite3.DatabaseError if the file isn't a SQLite database.
+    """
+    if not Path(db_filename).exists():
+        return 0
+    # Read-only, so checking never changes the database
+    connection = sqlite3.connect(Path(db_filename).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        return count_notes(connection)
+    finally:
+        connection.close()
+
+def decode_base64(text):
+    if text is None:
+        return None
+    output = io.BytesIO()
+    decoder = Base64StreamDecoder(output)
+    decoder.feed(text)
+    decoder.close()
+    return output.getvalue()
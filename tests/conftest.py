@@ -0,0 +1,63 @@
+import pytest
+
+from enex_parser import EnexParser
+from note import NoteWriter
+
+def write_enex(path, note_count, title=lambda i: f"Note {i}", content=lambda i: f"<div>Body {i}</div>",
+               created=lambda i: f"20130730T2052{i % 60:02d}Z", updated=None, tags=None, attributes=None,
+               resources=None, resource_data=lambda i: ("text/plain", "aGVsbG8=")):
+    """
+    Writes an export of note_count notes. Each of the other arguments is
+    called with the number of the note, or is None to leave its elements
+    out: content returns what goes inside <en-note>, tags a list of tags,
+    attributes the XML inside <note-attributes> and resources a list of
+    attachment filenames. The note's attachments have the (mime, base64
+    data) resource_data returns, "hello" by default.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<en-export>\n')
+        for i in range(note_count):
+            f.write(f"<note><title>{title(i)}</title>")
+            if content is not None:
+                f.write(f"<content><![CDATA[<en-note>{content(i)}</en-note>]]></content>")
+            if created is not None:
+                f.write(f"<created>{created(i)}</created>")
+            if updated is not None:
+                f.write(f"<updated>{updated(i)}</updated>")
+            for tag in tags(i) if tags is not None else []:
+                f.write(f"<tag>{tag}</tag>")
+            if attributes is not None:
+                f.write(f"<note-attributes>{attributes(i)}</note-attributes>")
+            mime, data = resource_data(i)
+            for filename in resources(i) if resources is not None else []:
+                f.write(f"<resource><data encoding=\"base64\">{data}</data><mime>{mime}</mime>")
+                f.write(f"<resource-attributes><file-name>{filename}</file-name></resource-attributes></resource>")
+            f.write("</note>\n")
+        f.write("</en-export>\n")
+
+def convert_enex(xml_input, output_dir, **kwargs):
+    """
+    Converts xml_input with a NoteWriter made with kwargs, and returns it.
+    """
+    note_writer = NoteWriter(output_dir, **kwargs)
+    parser = EnexParser()
+    parser.register_note_listener(note_writer)
+    parser.parseNoteXML(xml_input)
+    note_writer.close()
+    return note_writer
+
+def read_file_tree(root):
+    return {p.relative_to(root): p.read_bytes() for p in root.rglob("*") if p.is_file()}
+
+@pytest.fixture
+def make_enex():
+    return write_enex
+
+@pytest.fixture
+def convert():
+    return convert_enex
+
+@pytest.fixture
+def read_tree():
+    return read_file_tree
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from enex_parser import EnexParser
+from note import NoteWriter
+from batch_converter import BatchConverter, expand_inputs, get_notebook_dirs
+
+def convert(task):
+    xml_path, output_dir = task
+    parser = EnexParser()
+    note_writer = NoteWriter(output_dir)
+    parser.register_note_listener(note_writer)
+    parser.parseNoteXML(xml_path)
+    note_writer.close()
+    return parser.note_store.note_count
+
+def test_expand_inputs(tmp_path, make_enex):
+    for name in ["a.enex", "b.ENEX", "notes.txt", "sub/c.enex"]:
+        make_enex(tmp_path / name, 1)
+
+    assert expand_inputs([str(tmp_path)]) == [tmp_path / "a.enex", tmp_path / "b.ENEX"]
+    assert expand_inputs([str(tmp_path / "**" / "*.enex"), str(tmp_path / "a.enex")]) == \
+        [tmp_path / "a.enex", tmp_path / "sub" / "c.enex"]
+
+def test_notebook_dirs_are_unique(tmp_path):
+    xml_paths = [Path("a", "Work.enex"), Path("b", "work.enex.gz"), Path("Home.enex")]
+    assert get_notebook_dirs(tmp_path, xml_paths) == [tmp_path / "Work", tmp_path / "work-2", tmp_path / "Home"]
+
+def test_batch_conversion(tmp_path, make_enex):
+    xml_paths = [tmp_path / "a.enex", tmp_path / "b.enex", tmp_path / "broken.enex"]
+    make_enex(xml_paths[0], 3)
+    make_enex(xml_paths[1], 5)
+    xml_paths[2].write_text("<en-export><note>")
+    output_dirs = get_notebook_dirs(tmp_path / "output", xml_paths)
+
+    batch_converter = BatchConverter(convert, jobs=2)
+    results = batch_converter.run([(xml_path, (xml_path, output_dir))
+                                   for xml_path, output_dir in zip(xml_paths, output_dirs)])
+
+    assert [(result["file"], result["notes"]) for result in results] == \
+        [(str(xml_paths[0]), 3), (str(xml_paths[1]), 5), (str(xml_paths[2]), 0)]
+    assert [result["file"] for result in batch_converter.failures()] == [str(xml_paths[2])]
+    assert len(list(Path(tmp_path, "output", "b", "2013").iterdir())) == 5
+    report = batch_converter.report()
+    assert report["notes"] == 8
+    assert report["failed"] == 1
+    assert "Converted 3 notebooks (1 failed): 8 notes" in batch_converter.format_report()
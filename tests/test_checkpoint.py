@@ -0,0 +1,66 @@
+import pytest
+from pathlib import Path
+
+from enex_parser import EnexParser
+from note import NoteWriter
+from note_index import NoteIndex
+from checkpoint import Checkpoint, CheckpointListener
+
+class FailingNoteWriter(NoteWriter):
+    def write_note(self, note):
+        self.written.append(note.title)
+        if note.title == self.fail_at:
+            raise RuntimeError("Interrupted")
+        return super().write_note(note)
+
+def convert(xmlpath, output_dir, resume=False, fail_at=None, incremental=False):
+    note_writer = FailingNoteWriter(output_dir, incremental=incremental, resource_dedup=NoteWriter.ResourceDedup.HARDLINK)
+    note_writer.written = []
+    note_writer.fail_at = fail_at
+    checkpoint = Checkpoint(output_dir, xmlpath)
+    xml_input = xmlpath
+    if resume and checkpoint.load():
+        note_writer.set_state(checkpoint.writer_state)
+        index = NoteIndex.build(xmlpath)
+        xml_input = index.open_notes(checkpoint.notes_done, len(index))
+    listener = CheckpointListener(note_writer, checkpoint, interval=3)
+    parser = EnexParser()
+    parser.register_note_listener(listener)
+    parser.parseNoteXML(xml_input)
+    listener.close()
+    return note_writer.written
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_resume_after_interruption(tmp_path, incremental, make_enex, read_tree):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 10, resources=lambda i: [f"hello{i}.txt"])
+    clean_dir = tmp_path / "clean"
+    convert(xmlpath, clean_dir, incremental=incremental)
+    assert not Path(clean_dir, ".enex2markdown-checkpoint.json").exists()
+
+    output_dir = tmp_path / "resumed"
+    with pytest.raises(RuntimeError):
+        convert(xmlpath, output_dir, fail_at="Note 7", incremental=incremental)
+    checkpoint = Checkpoint(output_dir, xmlpath)
+    assert checkpoint.load()
+    assert checkpoint.notes_done == 6
+    assert checkpoint.last_title == "Note 5"
+    # Growing state is journaled rather than kept in the checkpoint
+    assert set(checkpoint.writer_state) == {"dedup_journal_size", "index_size"}
+    assert Path(output_dir, ".enex2markdown-dedup.jsonl").exists()
+
+    assert convert(xmlpath, output_dir, resume=True, incremental=incremental) == [f"Note {i}" for i in range(6, 10)]
+    assert read_tree(output_dir) == read_tree(clean_dir)
+    shared_file = Path(output_dir, "2013", "20130730T205200Z-hello0.txt")
+    assert Path(output_dir, "2013", "20130730T205209Z-hello9.txt").samefile(shared_file)
+    assert Path(output_dir, "2013", "20130730T205203Z-hello3.txt").samefile(shared_file)
+
+def test_checkpoint_for_other_export_is_ignored(tmp_path, make_enex):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 10, resources=lambda i: [f"hello{i}.txt"])
+    output_dir = tmp_path / "output"
+    with pytest.raises(RuntimeError):
+        convert(xmlpath, output_dir, fail_at="Note 4")
+
+    make_enex(xmlpath, 11, resources=lambda i: [f"hello{i}.txt"])
+    assert not Checkpoint(output_dir, xmlpath).load()
@@ -0,0 +1,10 @@
+import pickle
+
+from note import NoteWriter
+
+def test_each_writer_has_its_own_context(tmp_path):
+    note_writer = NoteWriter(tmp_path)
+    # A worker process gets a copy of the writer without the parser
+    worker_writer = pickle.loads(pickle.dumps(note_writer))
+    assert worker_writer.context is not note_writer.context
+    assert worker_writer.context.enml_converter is not note_writer.context.enml_converter
@@ -0,0 +1,45 @@
+import io
+import time
+from pathlib import Path
+
+from conversion_stats import ConversionStats
+from enex_parser import EnexParser
+from note import Note
+from note_listener import NoteListener
+
+def test_nested_timers_are_exclusive():
+    stats = ConversionStats()
+    with stats.timer("io"):
+        with stats.timer("convert"):
+            time.sleep(0.02)
+    assert stats.stage_seconds["convert"] >= 0.02
+    assert stats.stage_seconds["io"] < 0.02
+
+def test_slowest_notes():
+    stats = ConversionStats(slowest_count=2)
+    for seconds in [0.1, 0.3, 0.2]:
+        note = Note()
+        note.title = f"{seconds}"
+        stats.note_finished(note, seconds)
+    report = stats.report()
+    assert report["notes"] == 3
+    assert [note["title"] for note in report["slowest_notes"]] == ["0.3", "0.2"]
+    # The 0-based index --note takes
+    assert [note["ordinal"] for note in report["slowest_notes"]] == [1, 2]
+
+def test_parse_with_stats():
+    xmlpath = Path('pytest_input_files', 'test_parse_note.xml')
+    progress = io.StringIO()
+    stats = ConversionStats(total_bytes=xmlpath.stat().st_size, progress=True, progress_stream=progress)
+    parser = EnexParser()
+    parser.register_note_listener(NoteListener())
+    parser.set_stats(stats)
+    parser.parseNoteXML(xmlpath)
+    stats.finish()
+
+    assert stats.notes == 1
+    assert stats.bytes_read == xmlpath.stat().st_size
+    assert stats.stage_seconds["parse"] > 0
+    assert stats.stage_seconds["decode"] > 0
+    assert "1 notes" in progress.getvalue()
+    assert "Time by stage:" in stats.format_report()
@@ -1,5 +1,10 @@
+import io
 import textwrap
 
+import pytest
+from lxml import etree
+
+import enml_converter
 from enml_converter import ENMLConverter
 
 def test_text():
@@ -66,3 +71,40 @@ def test_collapse_consecutive_blank_lines():
         </en-note>
     """))
     assert result == "\n\nHello World!\n\n"
+
+def test_deep_nesting():
+    # Deeper than the Python recursion limit
+    depth = 2000
+    enml_converter = ENMLConverter()
+    result = enml_converter.to_markdown("<en-note>" + "<span>" * depth + "Hello World!" + "</span>" * depth + "</en-note>")
+    assert result == "Hello World!"
+
+def test_write_markdown():
+    enml_converter = ENMLConverter()
+    f = io.StringIO()
+    enml_converter.write_markdown("<en-note>Hello<br/>World!</en-note>", f)
+    assert f.getvalue() == "Hello\n\n\nWorld!"
+
+def test_xml_declaration_after_whitespace():
+    enml_converter = ENMLConverter()
+    result = enml_converter.to_markdown(textwrap.dedent("""
+        <?xml version="1.0" encoding="UTF-8" standalone="no"?>
+        <!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">
+        <en-note>
+            Hello World!
+        </en-note>
+    """))
+    assert result == "Hello World!"
+
+def test_small_feed_chunks(monkeypatch):
+    # Elements and text split across chunks are only written once complete
+    monkeypatch.setattr(enml_converter, "FEED_CHUNK_SIZE", 3)
+    converter = ENMLConverter()
+    result = converter.to_markdown('<en-note>Hello<div>World</div><a href="http://helloworld.com">Hello World!</a></en-note>')
+    assert result == "Hello\n\n\nWorld\n\n\n[Hello World!](http://helloworld.com)"
+
+def test_reuse_after_error():
+    converter = ENMLConverter()
+    with pytest.raises(etree.XMLSyntaxError):
+        converter.to_markdown("<en-note><div>Broken</en-note>")
+    assert converter.to_markdown("<en-note>Hello World!</en-note>") == "Hello World!"
@@ -0,0 +1,93 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from note import Note
+from export_index import ExportIndex
+
+NOTES = dict(title=lambda i: f"Note [{i}]", created=lambda i: f"{2012 + i % 2}0730T2052{i:02d}Z",
+             tags=lambda i: [f"t{i % 2}"], resources=lambda i: ["hello.txt"])
+
+def read_index(output_dir):
+    with open(output_dir / "index.jsonl", "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_index_records(tmp_path, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 3, **NOTES)
+    output_dir = tmp_path / "out"
+    convert(xmlpath, output_dir, index=True)
+
+    records = read_index(output_dir)
+    assert [record["path"] for record in records] == \
+        ["2012/20120730T205200Z.md", "2013/20130730T205201Z.md", "2012/20120730T205202Z.md"]
+    record = records[1]
+    assert record["title"] == "Note [1]"
+    assert record["tags"] == ["t1"]
+    assert record["created"] == "2013-07-30T20:52:01+00:00"
+    assert record["updated"] is None
+    assert record["resources"] == [{"path": "2013/20130730T205201Z-hello.txt", "filename": "20130730T205201Z-hello.txt",
+                                    "mime": "text/plain", "size": 5, "md5": "5d41402abc4b2a76b9719d911017c592"}]
+    for record in records:
+        assert (output_dir / record["path"]).exists()
+        assert (output_dir / record["resources"][0]["path"]).read_bytes() == b"hello"
+
+def test_index_pages(tmp_path, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 3, **NOTES)
+    output_dir = tmp_path / "out"
+    convert(xmlpath, output_dir, index=True)
+
+    assert (output_dir / "Tags.md").read_text(encoding="utf-8") == (
+        "# Tags\n\n"
+        "## t0\n\n"
+        "- [Note \\[0\\]](2012/20120730T205200Z.md) (2012-07-30)\n"
+        "- [Note \\[2\\]](2012/20120730T205202Z.md) (2012-07-30)\n\n"
+        "## t1\n\n"
+        "- [Note \\[1\\]](2013/20130730T205201Z.md) (2013-07-30)\n\n")
+    years_page = (output_dir / "Years.md").read_text(encoding="utf-8")
+    assert years_page.index("## 2012") < years_page.index("Note \\[2\\]") < years_page.index("## 2013")
+
+def test_unchanged_notes_stay_in_index(tmp_path, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 3, **NOTES)
+    output_dir = tmp_path / "out"
+    convert(xmlpath, output_dir, incremental=True, index=True)
+    first_records = read_index(output_dir)
+    convert(xmlpath, output_dir, incremental=True, index=True)
+    assert read_index(output_dir) == first_records
+
+def test_resume_index(tmp_path):
+    output_dir = tmp_path / "out"
+    note = Note()
+    note.title = "Kept"
+    note.created = datetime(2013, 7, 30, 20, 52, tzinfo=timezone.utc)
+    index = ExportIndex(output_dir)
+    index.add(note, output_dir / "2013" / "kept.md", [])
+    size = index.get_size()
+    note.title = "Lost"
+    index.add(note, output_dir / "2013" / "lost.md", [])
+    index.flush()
+
+    index = ExportIndex(output_dir)
+    index.resume(size)
+    index.close()
+    assert [record["title"] for record in read_index(output_dir)] == ["Kept"]
+    assert "lost.md" not in (output_dir / "Years.md").read_text(encoding="utf-8")
+
+@pytest.mark.parametrize("output_dir", [".", "out", "./out/"])
+def test_relative_output_dir(tmp_path, monkeypatch, output_dir, make_enex, convert):
+    monkeypatch.chdir(tmp_path)
+    make_enex(tmp_path / "notes.enex", 2, **NOTES)
+    convert("notes.enex", output_dir, index=True)
+
+    records = read_index(Path(output_dir))
+    assert [record["path"] for record in records] == ["2012/20120730T205200Z.md", "2013/20130730T205201Z.md"]
+    assert records[0]["resources"][0]["path"] == "2012/20120730T205200Z-hello.txt"
+
+def test_file_outside_output_dir(tmp_path):
+    index = ExportIndex(tmp_path / "out")
+    with pytest.raises(ValueError):
+        index.relative_path(tmp_path / "elsewhere" / "note.md")
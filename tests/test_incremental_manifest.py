@@ -0,0 +1,75 @@
+import re
+import urllib.parse
+from pathlib import Path
+
+import pytest
+
+from enex_parser import EnexParser
+from note import NoteWriter
+
+class CountingNoteWriter(NoteWriter):
+    def write_note(self, note):
+        self.written.append(note.title)
+        return super().write_note(note)
+
+def export(xmlpath, output_dir, attachments=EnexParser.Attachments.ALL, **kwargs):
+    note_writer = CountingNoteWriter(output_dir, incremental=True, attachments=attachments, **kwargs)
+    note_writer.written = []
+    parser = EnexParser(attachments)
+    parser.register_note_listener(note_writer)
+    parser.parseNoteXML(xmlpath)
+    note_writer.close()
+    return note_writer.written
+
+def test_incremental_export(tmp_path, make_enex):
+    xmlpath = tmp_path / "notes.enex"
+    output_dir = tmp_path / "output"
+    updated = ["20130801T000000Z"] * 3
+    make_enex(xmlpath, 3, content=lambda i: f"Body {i}", updated=lambda i: updated[i], resources=lambda i: [f"hello{i}.txt"])
+    assert export(xmlpath, output_dir) == ["Note 0", "Note 1", "Note 2"]
+    assert export(xmlpath, output_dir) == []
+
+    updated[1] = "20130802T000000Z"
+    make_enex(xmlpath, 3, content=lambda i: f"Body {i}", updated=lambda i: updated[i], resources=lambda i: [f"hello{i}.txt"])
+    assert export(xmlpath, output_dir) == ["Note 1"]
+
+    Path(output_dir, "2013", "20130730T205202Z-hello2.txt").unlink()
+    assert export(xmlpath, output_dir) == ["Note 2"]
+    assert Path(output_dir, "2013", "20130730T205202Z-hello2.txt").read_bytes() == b"hello"
+
+@pytest.mark.parametrize("attachments", [EnexParser.Attachments.NONE, EnexParser.Attachments.METADATA])
+def test_attachments_mode_change_writes_notes_again(tmp_path, make_enex, attachments):
+    xmlpath = tmp_path / "notes.enex"
+    output_dir = tmp_path / "output"
+    make_enex(xmlpath, 2, resources=lambda i: [f"hello{i}.txt"])
+    assert export(xmlpath, output_dir, attachments) == ["Note 0", "Note 1"]
+    assert export(xmlpath, output_dir, attachments) == []
+
+    assert export(xmlpath, output_dir) == ["Note 0", "Note 1"]
+    assert Path(output_dir, "2013", "20130730T205201Z-hello1.txt").read_bytes() == b"hello"
+    assert "(20130730T205201Z-hello1.txt)" in Path(output_dir, "2013", "20130730T205201Z.md").read_text(encoding="utf-8")
+    assert export(xmlpath, output_dir) == []
+
+@pytest.mark.parametrize("resource_dedup", list(NoteWriter.ResourceDedup))
+def test_skipped_notes_keep_their_shared_attachments(tmp_path, make_enex, resource_dedup):
+    xmlpath = tmp_path / "notes.enex"
+    output_dir = tmp_path / "output"
+    payloads = ["aGVsbG8=", "aGVsbG8="] # Both notes have b"hello"
+    updated = ["20130801T000000Z"] * 2
+    def write_export():
+        make_enex(xmlpath, 2, updated=lambda i: updated[i], resources=lambda i: ["hello.txt"],
+                  resource_data=lambda i: ("text/plain", payloads[i]))
+    write_export()
+    assert export(xmlpath, output_dir, resource_dedup=resource_dedup) == ["Note 0", "Note 1"]
+
+    # The note that owns the shared payload changes its attachment
+    payloads[0] = "Ynll" # b"bye"
+    updated[0] = "20130802T000000Z"
+    write_export()
+    written = export(xmlpath, output_dir, resource_dedup=resource_dedup)
+    assert written[0] == "Note 0"
+    markdown = Path(output_dir, "2013", "20130730T205201Z.md").read_text(encoding="utf-8")
+    link = urllib.parse.unquote(re.search(r"\]\((.*)\)", markdown).group(1))
+    assert Path(output_dir, "2013", link).read_bytes() == b"hello"
+    # Only a note that links to another note's file has to be written again
+    assert written == (["Note 0", "Note 1"] if resource_dedup == NoteWriter.ResourceDedup.SHARED else ["Note 0"])
@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from enex_parser import EnexParser
+from note_listener import NoteListener
+from input_reader import open_enex, is_compressed, get_export_name
+
+def parse_notes(xml_input):
+    parser = EnexParser()
+    listener = NoteListener()
+    parser.register_note_listener(listener)
+    parser.parseNoteXML(xml_input)
+    return [(note.title, note.created, note.content) for note in listener.notes]
+
+def test_plain_export_parses_like_filename(tmp_path, make_enex):
+    xmlpath = tmp_path / "Notes.enex"
+    make_enex(xmlpath, 200)
+    with open_enex(xmlpath, block_size=4096) as f:
+        assert parse_notes(f) == parse_notes(str(xmlpath))
+
+def test_gzip_export(tmp_path, make_enex):
+    xmlpath = tmp_path / "Notes.enex"
+    make_enex(xmlpath, 200)
+    gzpath = tmp_path / "Notes.enex.gz"
+    gzpath.write_bytes(gzip.compress(xmlpath.read_bytes()))
+    with open_enex(gzpath) as f:
+        assert parse_notes(f) == parse_notes(str(xmlpath))
+
+def test_zstd_export(tmp_path, make_enex):
+    zstandard = pytest.importorskip("zstandard")
+    xmlpath = tmp_path / "Notes.enex"
+    make_enex(xmlpath, 200)
+    zstpath = tmp_path / "Notes.enex.zst"
+    zstpath.write_bytes(zstandard.ZstdCompressor().compress(xmlpath.read_bytes()))
+    with open_enex(zstpath, block_size=4096) as f:
+        assert parse_notes(f) == parse_notes(str(xmlpath))
+
+def test_export_names():
+    assert get_export_name("dir/Work.enex") == "Work"
+    assert get_export_name("Work.ENEX.GZ") == "Work"
+    assert get_export_name("Work.enex.zst") == "Work"
+    assert get_export_name("Work.xml") == "Work.xml"
+    assert is_compressed("a.enex.zst") and not is_compressed("a.enex")
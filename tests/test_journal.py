@@ -0,0 +1,26 @@
+from journal import Journal
+
+def test_entries_are_appended(tmp_path):
+    journal = Journal(tmp_path / "state.journal")
+    journal.add(["a", 1])
+    journal.flush()
+    size = journal.size()
+    journal.add(["b", 2])
+    journal.add(["c", 3])
+    journal.flush()
+    assert journal.read() == [["a", 1], ["b", 2], ["c", 3]]
+    assert journal.read(size) == [["a", 1]]
+
+    journal.truncate(size)
+    assert Journal(tmp_path / "state.journal").read() == [["a", 1]]
+
+def test_cut_short_line_is_ignored(tmp_path):
+    path = tmp_path / "state.journal"
+    path.write_bytes(b'["a",1]\n["b",')
+    assert Journal(path).read() == [["a", 1]]
+
+def test_missing_journal(tmp_path):
+    journal = Journal(tmp_path / "state.journal")
+    assert journal.read() == []
+    assert journal.size() == 0
+    journal.remove()
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from enex_parser import EnexParser
+from note import NoteWriter
+from naming_registry import NamingRegistry, REGISTRY_FILENAME
+from note_index import NoteIndex
+
+def make_titled_enex(make_enex, path, titles):
+    # Every note is created in the same second
+    make_enex(path, len(titles), title=lambda i: titles[i], content=lambda i: titles[i],
+              created=lambda i: "20130730T205204Z", resources=lambda i: ["Hello.txt", "Hello.txt"])
+
+def read_titles(output_dir):
+    return {p.name: p.read_text(encoding="utf-8").splitlines()[0] for p in Path(output_dir, "2013").glob("*.md")}
+
+def test_notes_in_the_same_second_get_unique_names(tmp_path, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_titled_enex(make_enex, xmlpath, ["A", "B", "A"])
+    convert(xmlpath, tmp_path / "output")
+
+    assert read_titles(tmp_path / "output") == {
+        "20130730T205204Z.md": "# A",
+        "20130730T205204Z-2.md": "# B",
+        "20130730T205204Z-3.md": "# A",
+    }
+    assert sorted(p.name for p in Path(tmp_path, "output", "2013").glob("*.txt")) == [
+        "20130730T205204Z-2-Hello-2.txt", "20130730T205204Z-2-Hello.txt",
+        "20130730T205204Z-3-Hello-2.txt", "20130730T205204Z-3-Hello.txt",
+        "20130730T205204Z-Hello-2.txt", "20130730T205204Z-Hello.txt",
+    ]
+
+def test_names_are_stable_across_runs(tmp_path, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_titled_enex(make_enex, xmlpath, ["A", "B"])
+    convert(xmlpath, tmp_path / "output")
+
+    # A new note and a different order don't rename the notes already there
+    make_titled_enex(make_enex, xmlpath, ["C", "B", "A"])
+    convert(xmlpath, tmp_path / "output")
+    assert read_titles(tmp_path / "output") == {
+        "20130730T205204Z.md": "# A",
+        "20130730T205204Z-2.md": "# B",
+        "20130730T205204Z-3.md": "# C",
+    }
+
+def test_naming_doesnt_probe_the_filesystem(tmp_path, monkeypatch, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_titled_enex(make_enex, xmlpath, ["A", "B", "C"])
+    def fail(*_args):
+        raise AssertionError("Output names must not depend on the filesystem")
+    monkeypatch.setattr(Path, "exists", fail)
+    monkeypatch.setattr(Path, "is_file", fail)
+    convert(xmlpath, tmp_path / "output")
+
+def test_registry_without_output_dir():
+    registry = NamingRegistry()
+    registry.save()
+    assert registry.path is None
+
+def test_shards_name_notes_like_a_whole_conversion(tmp_path, make_enex, convert):
+    xmlpath = tmp_path / "notes.enex"
+    make_titled_enex(make_enex, xmlpath, ["N0", "N1", "N2", "N3"])
+    convert(xmlpath, tmp_path / "whole")
+
+    index = NoteIndex.build(xmlpath)
+    for shard_index in range(2):
+        start, stop = index.shard(shard_index, 2)
+        assert stop - start == 2
+        note_writer = NoteWriter(tmp_path / "sharded", persistent_names=False)
+        note_writer.name_earlier_notes(index.headers(0, start))
+        parser = EnexParser()
+        parser.register_note_listener(note_writer)
+        with index.open_notes(start, stop) as f:
+            parser.parseNoteXML(f)
+        note_writer.close()
+
+    assert read_titles(tmp_path / "sharded") == read_titles(tmp_path / "whole")
+    assert len(read_titles(tmp_path / "sharded")) == 4
+    # Shards don't save the names, a later whole conversion does
+    assert not Path(tmp_path, "sharded", REGISTRY_FILENAME).exists()
+
+def test_checkpoints_journal_new_names(tmp_path):
+    registry = NamingRegistry(tmp_path)
+    registry.title_name("A", "20130730T205204Z")
+    registry.checkpoint()
+    saved = Path(tmp_path, REGISTRY_FILENAME).read_bytes()
+    registry.title_name("B", "20130730T205204Z")
+    registry.checkpoint()
+    # Only the journal grows after the first checkpoint
+    assert Path(tmp_path, REGISTRY_FILENAME).read_bytes() == saved
+
+    reloaded = NamingRegistry(tmp_path)
+    assert reloaded.title_name("B", "20130730T205204Z") == "20130730T205204Z-2"
+    reloaded.save()
+    assert not Path(tmp_path, REGISTRY_FILENAME + ".journal").exists()
@@ -1,5 +1,6 @@
 import pytest
 from note import Note, NoteResource, NoteWriter
+from enml_converter import ENMLConverter
 import io
 from datetime import datetime, timezone
 from pathlib import Path
@@ -196,3 +197,77 @@ def test_output_multiple_resource_files():
     for test_resource in test_resources:
         expected_output_path = Path('pytest_output', '2001', F"20010203T040506Z-{test_resource[0]}")
         assert expected_output_path.exists()
+
+def make_note_with_resource(created, filename):
+    note = Note()
+    note.created = created
+    resource = NoteResource()
+    resource.filename = filename
+    resource.mime = "image/png"
+    with open(Path('pytest_input_files', 'b64-color-splash-png-free-download-png.txt'), "r") as f:
+        resource.data = f.read()
+    note.resources.append(resource)
+    return note
+
+def test_dedup_resources_shared(tmp_path):
+    note_writer = NoteWriter(tmp_path, resource_dedup=NoteWriter.ResourceDedup.SHARED)
+    note_writer.add_note(make_note_with_resource(datetime(2001, 2, 3, 4, 5, 6, tzinfo=timezone.utc), "logo.png"))
+    note_writer.add_note(make_note_with_resource(datetime(2002, 2, 3, 4, 5, 6, tzinfo=timezone.utc), "logo.png"))
+    note_writer.close()
+
+    assert Path(tmp_path, '2001', '20010203T040506Z-logo.png').exists()
+    assert not Path(tmp_path, '2002', '20020203T040506Z-logo.png').exists()
+    with open(Path(tmp_path, '2002', '20020203T040506Z.md'), "r", encoding="utf-8") as f:
+        assert "![20020203T040506Z-logo.png](../2001/20010203T040506Z-logo.png)" in f.read()
+
+def test_dedup_resources_hardlink(tmp_path):
+    note_writer = NoteWriter(tmp_path, resource_dedup=NoteWriter.ResourceDedup.HARDLINK)
+    note_writer.add_note(make_note_with_resource(datetime(2001, 2, 3, 4, 5, 6, tzinfo=timezone.utc), "logo.png"))
+    note_writer.add_note(make_note_with_resource(datetime(2002, 2, 3, 4, 5, 6, tzinfo=timezone.utc), "logo.png"))
+    note_writer.close()
+
+    first = Path(tmp_path, '2001', '20010203T040506Z-logo.png')
+    second = Path(tmp_path, '2002', '20020203T040506Z-logo.png')
+    assert first.read_bytes() == second.read_bytes()
+    with open(Path(tmp_path, '2002', '20020203T040506Z.md'), "r", encoding="utf-8") as f:
+        assert "![20020203T040506Z-logo.png](20020203T040506Z-logo.png)" in f.read()
+
+def test_metadata_only_resource(tmp_path):
+    note = Note()
+    note.created = datetime(2001, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    resource = NoteResource()
+    resource.filename = "photo.png"
+    resource.mime = "image/png"
+    resource.size = 1234
+    resource.hash = "0123456789abcdef0123456789abcdef"
+    note.resources.append(resource)
+    note_writer = NoteWriter(tmp_path, resource_dedup=NoteWriter.ResourceDedup.SHARED)
+    note_writer.add_note(note)
+
+    assert [p.name for p in Path(tmp_path, "2001").iterdir()] == ["20010203T040506Z.md"]
+    text = Path(tmp_path, "2001", "20010203T040506Z.md").read_text(encoding="utf-8")
+    assert "Attachment: 20010203T040506Z-photo.png (image/png, 1234 bytes, md5 0123456789abcdef0123456789abcdef)" in text
+
+def test_markdown_is_converted_once(monkeypatch):
+    note = Note()
+    note.content = "<en-note><div>Hello</div></en-note>"
+    conversions = []
+    converter = ENMLConverter()
+    original_to_markdown = converter.to_markdown
+    monkeypatch.setattr(converter, "to_markdown", lambda content: conversions.append(content) or original_to_markdown(content))
+
+    assert note.get_markdown(converter).strip() == "Hello"
+    assert note.get_markdown(converter).strip() == "Hello"
+    assert len(conversions) == 1
+
+    note.drop_content()
+    assert note.content is None
+    assert note.markdown.strip() == "Hello"
+    note.content = "<en-note><div>Changed</div></en-note>"
+    assert note.markdown.strip() == "Changed"
+
+def test_note_has_no_dict():
+    note = Note()
+    with pytest.raises(AttributeError):
+        note.colour = "red"
+    assert not hasattr(NoteResource(), "__dict__")
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+import enex_parser
+from enex_parser import EnexParser
+from note import Note
+from note_listener import NoteListener
+from note_filter import NoteFilter, parse_filter_date
+
+def make_note(title, created, updated=None, tags=()):
+    note = Note()
+    note.title = title
+    note.created = parse_filter_date(created) if created is not None else None
+    note.updated = parse_filter_date(updated) if updated is not None else None
+    note.tags = list(tags)
+    return note
+
+def test_filter_by_date():
+    note_filter = NoteFilter(since=parse_filter_date("2019-01-01"), until=parse_filter_date("2020-01-01"))
+    assert note_filter.matches(make_note("a", "2019-01-01"))
+    assert note_filter.matches(make_note("a", "2019-12-31T23:59:59"))
+    assert not note_filter.matches(make_note("a", "2020-01-01"))
+    assert not note_filter.matches(make_note("a", "2018-12-31", updated="2019-06-01"))
+
+    note_filter = NoteFilter(since=parse_filter_date("2019-01-01"), date_field="updated")
+    assert note_filter.matches(make_note("a", "2018-12-31", updated="2019-06-01"))
+    assert not note_filter.matches(make_note("a", "2018-12-31"))
+
+def test_filter_by_tag_and_title():
+    note_filter = NoteFilter(tags=["Work", "travel"], title_pattern=r"^Trip")
+    assert note_filter.matches(make_note("Trip to Oslo", "2019-01-01", tags=["work"]))
+    assert not note_filter.matches(make_note("Trip to Oslo", "2019-01-01", tags=["home"]))
+    assert not note_filter.matches(make_note("My trip", "2019-01-01", tags=["travel"]))
+
+def test_filter_rules_out_partial_notes():
+    note_filter = NoteFilter(tags=["work"], since=parse_filter_date("2019-01-01"), title_pattern=r"^Trip")
+    assert note_filter.rules_out(make_note("My trip", None))
+    assert not note_filter.rules_out(make_note("Trip to Oslo", None))
+    assert note_filter.rules_out(make_note("Trip to Oslo", "2018-12-31"))
+    # Tags still to come could match
+    assert not note_filter.rules_out(make_note("Trip to Oslo", "2019-01-01", tags=["home"]))
+
+    note_filter = NoteFilter(since=parse_filter_date("2019-01-01"), date_field="updated")
+    # The updated time still to come could match
+    assert not note_filter.rules_out(make_note("a", "2018-12-31"))
+    assert note_filter.rules_out(make_note("a", "2019-06-01", updated="2018-12-31"))
+
+def test_parse_date():
+    assert parse_filter_date("2019-02-03") == datetime(2019, 2, 3, tzinfo=timezone.utc)
+    assert parse_filter_date("2019-02-03T04:05:06Z") == datetime(2019, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+
+class RecordingListener(NoteListener):
+    def __init__(self):
+        super().__init__()
+        self.filtered_out = []
+
+    def note_filtered_out(self, note):
+        self.filtered_out.append(note)
+
+def test_parser_skips_filtered_notes(tmp_path):
+    xmlpath = tmp_path / "notes.enex"
+    with open(xmlpath, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<en-export>\n')
+        for i in range(4):
+            f.write(f"<note><title>Note {i}</title><content><![CDATA[<en-note>Body {i}</en-note>]]></content>")
+            f.write(f"<created>201{i}0730T205200Z</created><tag>tag{i % 2}</tag>")
+            f.write("<resource><data encoding=\"base64\">aGVsbG8=</data><mime>text/plain</mime></resource>")
+            f.write("</note>\n")
+        f.write("</en-export>\n")
+    listener = RecordingListener()
+    parser = EnexParser()
+    parser.set_note_filter(NoteFilter(tags=["tag1"], since=parse_filter_date("2012-01-01")))
+    parser.register_note_listener(listener)
+    parser.parseNoteXML(xmlpath)
+
+    assert [note.title for note in listener.notes] == ["Note 3"]
+    assert listener.notes[0].content == "<en-note>Body 3</en-note>"
+    assert listener.notes[0].resources[0].decoded_data.getvalue() == b"hello"
+    assert [note.title for note in listener.filtered_out] == ["Note 0", "Note 1", "Note 2"]
+    # Excluded notes never had their content or attachments read
+    assert all(note.content is None for note in listener.filtered_out)
+    assert all(note.resources[0].decoded_data is None for note in listener.filtered_out)
+
+def test_parser_does_not_collect_content_of_notes_ruled_out_by_title(tmp_path, make_enex, monkeypatch):
+    collected = []
+    content_end = enex_parser.ContentHandler.end
+    monkeypatch.setattr(enex_parser.ContentHandler, "end", lambda self, text: (collected.append(text), content_end(self, text)))
+    make_enex(tmp_path / "notes.enex", 4, title=lambda i: f"Trip {i}" if i % 2 else f"Note {i}")
+    listener = RecordingListener()
+    parser = EnexParser()
+    parser.set_note_filter(NoteFilter(title_pattern=r"^Trip"))
+    parser.register_note_listener(listener)
+    parser.parseNoteXML(tmp_path / "notes.enex")
+
+    assert collected == [None, "<en-note><div>Body 1</div></en-note>", None, "<en-note><div>Body 3</div></en-note>"]
+    assert [note.title for note in listener.notes] == ["Trip 1", "Trip 3"]
+    assert [note.content for note in listener.notes] == ["<en-note><div>Body 1</div></en-note>", "<en-note><div>Body 3</div></en-note>"]
+    assert [note.title for note in listener.filtered_out] == ["Note 0", "Note 2"]
@@ -0,0 +1,55 @@
+import os
+
+from enex_parser import EnexParser
+from note_listener import NoteListener
+from note_index import NoteIndex, get_index_path
+
+NOTES = dict(title=lambda i: f"Note {i} &amp; more", content=lambda i: "x" * i,
+             attributes=lambda i: "<author>someone</author>")
+
+def parse_titles(xml_input):
+    note_listener = NoteListener()
+    parser = EnexParser()
+    parser.register_note_listener(note_listener)
+    parser.parseNoteXML(xml_input)
+    return [note.title for note in note_listener.notes]
+
+def test_build_index(tmp_path, make_enex):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 10, **NOTES)
+    index = NoteIndex.build(xmlpath)
+    assert len(index) == 10
+    assert index.find_title("Note 3 & more") == 3
+    assert index.find_title("Note 3") is None
+    with index.open_notes(3, 4) as f:
+        assert parse_titles(f) == ["Note 3 & more"]
+
+def test_open_notes(tmp_path, make_enex):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 10, **NOTES)
+    index = NoteIndex.build(xmlpath)
+    with index.open_notes(4, 7) as f:
+        assert parse_titles(f) == [f"Note {i} & more" for i in range(4, 7)]
+
+def test_shards_cover_all_notes(tmp_path, make_enex):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 25, **NOTES)
+    index = NoteIndex.build(xmlpath)
+    titles = []
+    for shard_index in range(4):
+        with index.open_notes(*index.shard(shard_index, 4)) as f:
+            titles += parse_titles(f)
+    assert titles == parse_titles(xmlpath)
+
+def test_index_sidecar(tmp_path, make_enex):
+    xmlpath = tmp_path / "notes.enex"
+    make_enex(xmlpath, 5, **NOTES)
+    assert NoteIndex.load(xmlpath) is None
+    NoteIndex.load_or_build(xmlpath)
+    assert get_index_path(xmlpath).exists()
+    assert len(NoteIndex.load(xmlpath)) == 5
+
+    make_enex(xmlpath, 6, **NOTES)
+    os.utime(xmlpath, ns=(0, 0))
+    assert NoteIndex.load(xmlpath) is None
+    assert len(NoteIndex.load_or_build(xmlpath)) == 6
@@ -0,0 +1,104 @@
+import pytest
+import tarfile
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from note import Note, NoteResource, NoteWriter
+from output_backend import FileOutput, ThreadedFileOutput
+
+def make_resource():
+    resource = NoteResource()
+    resource.data = "aGVsbG8="
+    return resource
+
+def test_threaded_output_writes_files(tmp_path):
+    output = ThreadedFileOutput(4, max_pending=2)
+    for i in range(20):
+        output.write_text(Path(tmp_path, str(i % 3), f"{i}.md"), f"note {i}")
+        output.write_resource(Path(tmp_path, str(i % 3), f"{i}.txt"), make_resource())
+    output.close()
+
+    for i in range(20):
+        assert Path(tmp_path, str(i % 3), f"{i}.md").read_text(encoding="utf-8") == f"note {i}"
+        assert Path(tmp_path, str(i % 3), f"{i}.txt").read_bytes() == b"hello"
+    assert output.created_dirs == {Path(tmp_path, str(i)) for i in range(3)}
+
+def test_threaded_output_reports_errors_at_close(tmp_path):
+    Path(tmp_path, "not-a-dir").write_text("")
+    output = ThreadedFileOutput(2)
+    output.write_text(Path(tmp_path, "ok.md"), "fine")
+    output.write_text(Path(tmp_path, "not-a-dir", "note.md"), "fails")
+    with pytest.raises(OSError):
+        output.close()
+    assert Path(tmp_path, "ok.md").exists()
+    assert output.failed_files == {Path(tmp_path, "not-a-dir", "note.md")}
+
+def test_threaded_output_always_raises_failed_write(tmp_path):
+    Path(tmp_path, "not-a-dir").write_text("")
+    for i in range(200):
+        output = ThreadedFileOutput(2)
+        output.write_text(Path(tmp_path, "not-a-dir", f"{i}.md"), "fails")
+        with pytest.raises(OSError):
+            output.close()
+
+def test_threaded_output_tracks_a_bounded_number_of_writes(tmp_path):
+    output = ThreadedFileOutput(2, max_pending=2)
+    for i in range(50):
+        output.write_text(Path(tmp_path, f"{i}.md"), "")
+        assert len(output.futures) <= 5
+    output.close()
+
+def test_directories_created_once(tmp_path, monkeypatch):
+    mkdir_calls = []
+    original_mkdir = Path.mkdir
+    def counting_mkdir(path, *args, **kwargs):
+        mkdir_calls.append(path)
+        original_mkdir(path, *args, **kwargs)
+    monkeypatch.setattr(Path, "mkdir", counting_mkdir)
+    output = FileOutput()
+    for i in range(5):
+        output.write_text(Path(tmp_path, "2010", f"{i}.md"), "")
+    assert mkdir_calls == [Path(tmp_path, "2010")]
+
+def write_archive_notes(archive_path):
+    note_writer = NoteWriter(archive_path, NoteWriter.OutputStyle.ARCHIVE)
+    note = Note()
+    note.created = datetime(2001, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    note.title = "Archived"
+    resource = make_resource()
+    resource.filename = "hello.txt"
+    resource.mime = "text/plain"
+    note.resources.append(resource)
+    note_writer.add_note(note)
+    note_writer.close()
+
+def test_zip_archive(tmp_path):
+    archive_path = Path(tmp_path, "notes.zip")
+    write_archive_notes(archive_path)
+    with zipfile.ZipFile(archive_path) as zip_file:
+        assert sorted(zip_file.namelist()) == ["2001/20010203T040506Z-hello.txt", "2001/20010203T040506Z.md"]
+        assert "# Archived" in zip_file.read("2001/20010203T040506Z.md").decode("utf-8")
+        assert zip_file.read("2001/20010203T040506Z-hello.txt") == b"hello"
+
+def test_zip_archive_refuses_hardlinks(tmp_path):
+    archive_path = Path(tmp_path, "notes.zip")
+    with pytest.raises(ValueError, match="hardlinks"):
+        NoteWriter(archive_path, NoteWriter.OutputStyle.ARCHIVE, resource_dedup=NoteWriter.ResourceDedup.HARDLINK)
+    assert not archive_path.exists()
+
+@pytest.mark.parametrize("archive_name", ["notes.tar", "notes.tar.gz"])
+def test_tar_archive(tmp_path, archive_name):
+    archive_path = Path(tmp_path, archive_name)
+    write_archive_notes(archive_path)
+    with tarfile.open(archive_path) as tar_file:
+        assert sorted(tar_file.getnames()) == ["2001/20010203T040506Z-hello.txt", "2001/20010203T040506Z.md"]
+        assert tar_file.extractfile("2001/20010203T040506Z-hello.txt").read() == b"hello"
+
+def test_tar_zst_archive(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    archive_path = Path(tmp_path, "notes.tar.zst")
+    write_archive_notes(archive_path)
+    with open(archive_path, "rb") as f:
+        with tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(f), mode="r|") as tar_file:
+            assert sorted(member.name for member in tar_file) == ["2001/20010203T040506Z-hello.txt", "2001/20010203T040506Z.md"]
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from enex_parser import EnexParser
+from note import NoteWriter
+from parallel_writer import ParallelNoteWriter
+
+def make_image_enex(make_enex, path, note_count):
+    with open(Path('pytest_input_files', 'b64-color-splash-png-free-download-png.txt'), "r") as f:
+        image_data = f.read()
+    make_enex(path, note_count, created=lambda i: f"2013{i % 12 + 1:02d}28T2052{i % 60:02d}Z",
+              resources=lambda i: [f"image{i}.png"], resource_data=lambda i: ("image/png", image_data))
+
+def test_parallel_output_matches_serial(tmp_path, make_enex, read_tree):
+    xmlpath = tmp_path / "notes.enex"
+    make_image_enex(make_enex, xmlpath, 20)
+
+    serial_dir = tmp_path / "serial"
+    parser = EnexParser()
+    serial_writer = NoteWriter(serial_dir)
+    parser.register_note_listener(serial_writer)
+    parser.parseNoteXML(xmlpath)
+    serial_writer.close()
+
+    parallel_dir = tmp_path / "parallel"
+    parser = EnexParser()
+    parallel_writer = ParallelNoteWriter(NoteWriter(parallel_dir), jobs=2, max_pending=3)
+    parser.register_note_listener(parallel_writer)
+    parser.parseNoteXML(xmlpath)
+    parallel_writer.close()
+
+    serial_files = read_tree(serial_dir)
+    assert len([p for p in serial_files if p.parent.name == "2013"]) == 40
+    assert read_tree(parallel_dir) == serial_files
+
+def test_spooled_attachments_are_moved_into_place(tmp_path, make_enex, read_tree):
+    xmlpath = tmp_path / "notes.enex"
+    make_image_enex(make_enex, xmlpath, 5)
+
+    expected_dir = tmp_path / "in_memory"
+    parser = EnexParser()
+    note_writer = NoteWriter(expected_dir)
+    parser.register_note_listener(note_writer)
+    parser.parseNoteXML(xmlpath)
+    note_writer.close()
+
+    output_dir = tmp_path / "spooled"
+    parser = EnexParser(spool_threshold=1024)
+    note_writer = NoteWriter(output_dir)
+    parser.set_spool_dir(note_writer.spool_dir)
+    parser.register_note_listener(ParallelNoteWriter(note_writer, jobs=2))
+    parser.parseNoteXML(xmlpath)
+    parser.note_store.note_listener.close()
+
+    assert not note_writer.spool_dir.exists()
+    assert read_tree(output_dir) == read_tree(expected_dir)
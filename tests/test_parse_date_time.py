@@ -1,6 +1,52 @@
+import pytest
+import timestamps
 import enex_parser
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 def test_parse_date_time():
     assert enex_parser.parseDateTime("20100203T040506Z") == datetime(2010, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
     assert enex_parser.parseDateTime("20240628T171400Z") == datetime(2024, 6, 28, 17, 14, 0, tzinfo=timezone.utc)
+
+@pytest.mark.parametrize("datestr, expected", [
+    ("20100203T040506", datetime(2010, 2, 3, 4, 5, 6, tzinfo=timezone.utc)),
+    ("2010-02-03T04:05:06Z", datetime(2010, 2, 3, 4, 5, 6, tzinfo=timezone.utc)),
+    (" 2010-02-03T04:05:06.25Z\n", datetime(2010, 2, 3, 4, 5, 6, 250000, tzinfo=timezone.utc)),
+    ("20100203T040506+0130", datetime(2010, 2, 3, 2, 35, 6, tzinfo=timezone.utc)),
+    ("2010-02-03T04:05:06-05:00", datetime(2010, 2, 3, 9, 5, 6, tzinfo=timezone.utc)),
+])
+def test_parse_date_time_variants(datestr, expected):
+    assert timestamps.parse_timestamp(datestr) == expected
+
+def test_parsed_offsets_are_utc():
+    assert timestamps.parse_timestamp("2013-07-30T21:52:04+01:00").utcoffset() == timedelta(0)
+    assert timestamps.parse_timestamp_variant("20130730T215204+0100").utcoffset() == timedelta(0)
+
+def test_format_timestamp_matches_strftime():
+    for value in [datetime(2013, 7, 30, 20, 52, 4, tzinfo=timezone.utc), datetime(1999, 12, 31, 0, 0, 0)]:
+        formatted = timestamps.format_timestamp(value)
+        assert formatted.year == str(value.year)
+        assert formatted.compact == value.strftime('%Y%m%dT%H%M%SZ')
+        assert formatted.display == value.strftime('%Y-%m-%d %H:%M:%S')
+
+def test_format_timestamp_with_offset():
+    offset_value = datetime(2013, 7, 30, 21, 52, 4, tzinfo=timezone(timedelta(hours=1)))
+    formatted = timestamps.format_timestamp(offset_value)
+    assert formatted.compact == "20130730T205204Z"
+    assert formatted.display == "2013-07-30 20:52:04"
+    # Shares the cache entry of the same instant in UTC
+    assert timestamps.format_timestamp(datetime(2013, 7, 30, 20, 52, 4, tzinfo=timezone.utc)).compact == "20130730T205204Z"
+
+def test_parse_date_time_invalid():
+    with pytest.raises(ValueError):
+        timestamps.parse_timestamp("30.07.2013")
+
+def test_timestamps_are_cached():
+    assert timestamps.parse_timestamp("20100203T040506Z") is timestamps.parse_timestamp("20100203T040506Z")
+    value = datetime(2010, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    assert timestamps.format_timestamp(value) is timestamps.format_timestamp(value)
+
+def test_parse_date_time_without_native_parser(monkeypatch):
+    monkeypatch.setattr(timestamps, "native_parse", None)
+    parse_uncached = timestamps.parse_timestamp.__wrapped__
+    assert parse_uncached("20100203T040506Z") == datetime(2010, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    assert parse_uncached("2010-02-03T04:05:06.5+01:00") == datetime(2010, 2, 3, 3, 5, 6, 500000, tzinfo=timezone.utc)
@@ -1,9 +1,15 @@
+import logging
 import pytest
 from enex_parser import EnexParser
 from note_listener import NoteListener
 from note import NoteWriter
 from pathlib import Path
 import textwrap
+import tracemalloc
+import subprocess
+import sys
+import base64
+import os
 from datetime import datetime, timezone
 
 @pytest.fixture
@@ -71,3 +77,128 @@ def test_parse_note(single_note, note_listener):
             "Hb/FtyG9s9u1fR0+oTiIRvGq7W4bpisfUGk1CGVWtkIyM57n1rfDY+uqigtU76ffZkUsA6iajHZ6v/P8A4B//2Q=="
         assert note.resources[0].mime == "image/jpeg"
         assert note.resources[0].filename == "snapshot-DAE9FC15-88E3-46CF-B744-DA9B1B56EB57.jpg"
+
+def test_parse_many_notes(tmp_path, note_listener, make_enex):
+    xmlpath = tmp_path / "many.enex"
+    make_enex(xmlpath, 100)
+    parser = EnexParser()
+    parser.register_note_listener(note_listener)
+    parser.parseNoteXML(xmlpath)
+
+    assert [note.title for note in note_listener.iter_notes()] == [f"Note {i}" for i in range(100)]
+
+# Parses the export in argv[1] in a fresh interpreter and prints the peak
+# RSS of the parse, so libxml2's memory is counted and nothing the tests
+# allocated before is
+PEAK_RSS_SCRIPT = """
+import sys
+from enex_parser import EnexParser
+from note_listener import NoteListener
+from memory_stats import reset_peak_rss, peak_rss_bytes
+
+class DiscardingListener(NoteListener):
+    def add_note(self, note):
+        pass
+
+if len(sys.argv) > 2:
+    # Memory used and freed before the parse
+    earlier = bytearray(int(sys.argv[2]))
+    earlier[::4096] = b"x" * len(earlier[::4096]) # Make the pages resident
+    del earlier
+reset_peak_rss()
+before = peak_rss_bytes()
+parser = EnexParser()
+parser.register_note_listener(DiscardingListener())
+parser.parseNoteXML(sys.argv[1])
+print(before, peak_rss_bytes(), parser.peak_rss_per_run, parser.peak_rss)
+"""
+
+def run_peak_rss_script(*args):
+    result = subprocess.run([sys.executable, "-c", PEAK_RSS_SCRIPT, *map(str, args)], capture_output=True,
+                            text=True, check=True, env=dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent / "src")))
+    before, after, per_run, parser_peak = result.stdout.split()
+    if after == "None":
+        pytest.skip("The peak RSS isn't available on this platform")
+    return int(before), int(after), per_run == "True", int(parser_peak)
+
+def test_parse_memory_is_bounded(tmp_path, make_enex):
+    # Nothing is kept per note, so the peak doesn't grow with the export
+    peaks = []
+    for note_count in [1000, 20000]:
+        xmlpath = tmp_path / f"{note_count}.enex"
+        make_enex(xmlpath, note_count, content=lambda i: f"<div>Body {i} {'x' * 2000}</div>")
+        peaks.append(run_peak_rss_script(xmlpath)[1])
+    # The bigger export is about 40 MiB
+    assert peaks[1] < peaks[0] + 16 * 1024 * 1024
+
+def test_peak_rss_is_per_parse(tmp_path, make_enex):
+    xmlpath = tmp_path / "many.enex"
+    make_enex(xmlpath, 10)
+    before, _after, per_run, parser_peak = run_peak_rss_script(xmlpath, 64 * 1024 * 1024)
+    if not per_run:
+        pytest.skip("The peak RSS can't be reset on this platform")
+    assert 0 < parser_peak < before + 32 * 1024 * 1024
+
+def test_parse_with_debug_logging(tmp_path, note_listener, caplog, make_enex):
+    xmlpath = tmp_path / "many.enex"
+    make_enex(xmlpath, 3)
+    parser = EnexParser()
+    parser.register_note_listener(note_listener)
+    with caplog.at_level(logging.DEBUG, logger="enex2markdown"):
+        parser.parseNoteXML(xmlpath)
+
+    assert [note.title for note in note_listener.iter_notes()] == ["Note 0", "Note 1", "Note 2"]
+    assert "Found elem with tag: title" in caplog.text
+    assert "Title: Note 2" in caplog.text
+
+def test_parse_attachment_metadata_only(single_note, note_listener):
+    parser = EnexParser(EnexParser.Attachments.METADATA)
+    parser.register_note_listener(note_listener)
+    parser.parseNoteXML(single_note)
+    full_listener = NoteListenerForTests()
+    parser = EnexParser()
+    parser.register_note_listener(full_listener)
+    parser.parseNoteXML(single_note)
+
+    resource = next(note_listener.iter_notes()).resources[0]
+    full_resource = next(full_listener.iter_notes()).resources[0]
+    assert not resource.has_data()
+    assert resource.mime == "image/jpeg"
+    assert resource.filename == "snapshot-DAE9FC15-88E3-46CF-B744-DA9B1B56EB57.jpg"
+    assert resource.hash == full_resource.hash
+    assert resource.size == full_resource.decoded_data.size
+
+def test_parse_without_attachments(single_note, note_listener):
+    parser = EnexParser(EnexParser.Attachments.NONE)
+    parser.register_note_listener(note_listener)
+    parser.parseNoteXML(single_note)
+
+    note = next(note_listener.iter_notes())
+    assert note.title == "Test Note for Export"
+    assert note.tags == ["fake-tag"]
+    assert note.resources == []
+
+def test_attachment_is_decoded_in_pieces(tmp_path, note_listener):
+    payload = os.urandom(8 * 1024 * 1024)
+    xmlpath = tmp_path / "attachment.enex"
+    with open(xmlpath, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<en-export><note><title>Scan</title>')
+        f.write("<created>20130730T205204Z</created><resource><data encoding=\"base64\">")
+        f.write(base64.encodebytes(payload).decode("ascii"))
+        f.write("</data><mime>application/pdf</mime></resource></note></en-export>\n")
+    parser = EnexParser(spool_threshold=64 * 1024)
+    parser.set_spool_dir(tmp_path / "spool")
+    parser.register_note_listener(note_listener)
+
+    tracemalloc.start()
+    try:
+        parser.parseNoteXML(xmlpath)
+        _size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # The base64 text is never held whole
+    assert peak < 4 * 1024 * 1024
+    resource_data = next(note_listener.iter_notes()).resources[0].decoded_data
+    assert resource_data.spooled
+    assert resource_data.getvalue() == payload
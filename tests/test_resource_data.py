@@ -0,0 +1,73 @@
+import base64
+import io
+import os
+from pathlib import Path
+
+import resource_data
+from resource_data import ResourceData, Base64StreamDecoder
+
+def read_b64_file(name):
+    with open(Path('pytest_input_files', name), "r") as f:
+        return f.read()
+
+def test_decoder_matches_b64decode(monkeypatch):
+    # A small odd chunk size makes sure groups split across chunks decode correctly
+    monkeypatch.setattr(resource_data, "DECODE_CHUNK_SIZE", 7)
+    text = read_b64_file('b64-color-splash-png-free-download-png.txt')
+    output = io.BytesIO()
+    decoder = Base64StreamDecoder(output)
+    for start in range(0, len(text), 1000):
+        decoder.feed(text[start:start + 1000])
+    decoder.close()
+    assert output.getvalue() == base64.b64decode(''.join(text.split()))
+
+def test_small_payload_stays_in_memory():
+    data = ResourceData(spool_threshold=1024)
+    data.write(b"hello")
+    data.close()
+    assert not data.spooled
+    assert data.getvalue() == b"hello"
+
+def test_large_payload_is_spooled():
+    data = ResourceData(spool_threshold=4)
+    data.write(b"hello")
+    data.write(b" world")
+    data.close()
+    assert data.spooled
+    spool_path = data.spool_path
+    assert os.path.exists(spool_path)
+    assert data.size == 11
+    output = io.BytesIO()
+    data.save(output)
+    assert output.getvalue() == b"hello world"
+    data.discard()
+    assert not os.path.exists(spool_path)
+
+def test_spooled_payload_is_moved(tmp_path):
+    spool_dir = tmp_path / "spool"
+    data = ResourceData(spool_threshold=4, spool_dir=spool_dir)
+    data.write(b"hello world")
+    data.close()
+    assert Path(data.spool_path).parent == spool_dir
+    target = tmp_path / "hello.txt"
+    assert data.move_to(target)
+    assert target.read_bytes() == b"hello world"
+    opened = tmp_path / "opened.txt"
+    opened.write_bytes(b"")
+    assert os.stat(target).st_mode & 0o777 == os.stat(opened).st_mode & 0o777
+    assert list(spool_dir.iterdir()) == []
+    data.discard()
+    assert target.exists()
+
+def test_temporary_spool_file_is_private_and_copied(tmp_path):
+    data = ResourceData(spool_threshold=4)
+    data.write(b"hello world")
+    data.close()
+    assert os.stat(data.spool_path).st_mode & 0o777 == 0o600
+    assert not data.move_to(tmp_path / "hello.txt")
+    data.discard()
+
+def test_small_payload_is_not_moved(tmp_path):
+    data = ResourceData(spool_threshold=1024, spool_dir=tmp_path)
+    data.write(b"hello")
+    assert not data.move_to(tmp_path / "hello.txt")
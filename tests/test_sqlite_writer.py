@@ -0,0 +1,66 @@
+import hashlib
+import sqlite3
+
+import pytest
+from enex_parser import EnexParser
+from sqlite_writer import SQLiteNoteWriter, get_note_count
+
+@pytest.fixture
+def load(tmp_path, make_enex):
+    def load(note_count, **kwargs):
+        xmlpath = tmp_path / "notes.enex"
+        make_enex(xmlpath, note_count, content=lambda i: f"<div>Body {i} {'apple' if i % 2 == 0 else 'pear'}</div>",
+                  tags=lambda i: ["fruit", f"tag{i % 3}"], resources=lambda i: [f"hello{i}.txt"])
+        db_path = tmp_path / "notes.db"
+        writer = SQLiteNoteWriter(db_path, **kwargs)
+        parser = EnexParser()
+        parser.register_note_listener(writer)
+        parser.parseNoteXML(xmlpath)
+        writer.close()
+        return sqlite3.connect(db_path)
+    return load
+
+def test_sqlite_full_text_search(load):
+    connection = load(10, batch_size=3)
+
+    assert connection.execute("SELECT count(*) FROM notes").fetchone() == (10,)
+    rows = connection.execute(
+        "SELECT notes.title FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+        "WHERE notes_fts MATCH 'apple' ORDER BY notes.id").fetchall()
+    assert [title for (title,) in rows] == [f"Note {i}" for i in range(0, 10, 2)]
+    tags = connection.execute("SELECT tag FROM note_tags WHERE note_id = 1 ORDER BY tag").fetchall()
+    assert tags == [("fruit",), ("tag0",)]
+    markdown, created = connection.execute("SELECT markdown, created FROM notes WHERE id = 2").fetchone()
+    assert "Body 1 pear" in markdown
+    assert created == "2013-07-30 20:52:01"
+
+def test_sqlite_resources(load):
+    connection = load(2)
+
+    rows = connection.execute("SELECT filename, mime, size, hash, data FROM resources ORDER BY id").fetchall()
+    assert rows == [
+        (f"20130730T20520{i}Z-hello{i}.txt", "text/plain", 5, hashlib.md5(b"hello").hexdigest(), b"hello")
+        for i in range(2)
+    ]
+
+def test_sqlite_resource_metadata_only(load):
+    connection = load(2, store_resource_data=False)
+
+    assert connection.execute("SELECT size, data FROM resources").fetchall() == [(5, None), (5, None)]
+
+def test_sqlite_refuses_database_with_notes(load):
+    load(3)
+    with pytest.raises(ValueError, match="already has notes"):
+        load(3)
+    assert load(3, append=True).execute("SELECT count(*) FROM notes").fetchone() == (6,)
+
+def test_sqlite_note_count(tmp_path, load):
+    assert get_note_count(tmp_path / "notes.db") == 0
+    assert not (tmp_path / "notes.db").exists()
+    load(3)
+    assert get_note_count(tmp_path / "notes.db") == 3
+
+def test_sqlite_note_count_not_a_database(tmp_path):
+    (tmp_path / "notes.db").write_text("not a database")
+    with pytest.raises(sqlite3.DatabaseError):
+        get_note_count(tmp_path / "notes.db")